@@ -83,10 +83,120 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # Take the write lock when a transaction starts so concurrent
+            # stock reservations queue up instead of failing with "locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
 
+# Order processing
+# OrderView.post only reserves stock and queues an OrderEvent; the
+# InventoryManagementAgent pool (manage.py run_inventory_agent) applies
+# queued orders to the ontology in batches.
+
+ORDER_WORKER_COUNT = 2
+ORDER_WORKER_BATCH_SIZE = 100
+ORDER_WORKER_POLL_INTERVAL = 1.0
+
+# How long (seconds) a retried order submission with the same idempotency
+# key returns the original order instead of placing a new one
+ORDER_IDEMPOTENCY_TTL = 24 * 60 * 60
+
+# Delivered and cancelled orders older than this many days are moved out of
+# the ontology into date-partitioned archive files (manage.py archive_orders)
+ORDER_ARCHIVE_AFTER_DAYS = 180
+ORDER_ARCHIVE_DIR = BASE_DIR / 'ontology' / 'archive'
+
+# What deleting a product that orders still reference does: 'tombstone'
+# retires it from the catalog but keeps its triples, 'cascade' also removes
+# the referencing orders
+PRODUCT_DELETE_POLICY = 'tombstone'
+
+
+# Feedback
+# Feedback is written only to the database; the FeedbackProjectionAgent
+# (manage.py run_feedback_projector) copies changes into the ontology from
+# the FeedbackOutbox table in batches.
+
+FEEDBACK_WORKER_BATCH_SIZE = 200
+FEEDBACK_WORKER_POLL_INTERVAL = 1.0
+
+# A resubmitted feedback with identical content within this many seconds is
+# acknowledged but not stored again
+FEEDBACK_DUPLICATE_WINDOW = 24 * 60 * 60
+
+# Product ratings are ranked by a Bayesian average that counts this many
+# extra ratings at the store-wide mean, so a few reviews cannot dominate
+PRODUCT_RATING_PRIOR_WEIGHT = 5
+
+
+# Write throttling
+# Token buckets per client (username, or address when logged out) as
+# (burst capacity, tokens refilled per second). Buckets and duplicate
+# feedback digests live in the default cache, which is per process; point
+# CACHES at Memcached or Redis when running several server processes.
+
+RATE_LIMITS = {
+    'feedback': (5, 1 / 60),
+    'order': (10, 1 / 6),
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
+# Product images
+# Every published upload is resized to these widths (pixels) in WebP and
+# JPEG, in a variants/ folder beside the original, rendered by a pool of
+# IMAGE_WORKERS processes; the catalog offers them to browsers through srcset
+
+IMAGE_VARIANTS = {
+    'thumb': 160,
+    'card': 400,
+    'detail': 1000,
+}
+IMAGE_WORKERS = 2
+
+# Uploads wait in IMAGE_STAGING_DIR until run_image_worker validates and
+# publishes them. Finished jobs are kept IMAGE_JOB_RETENTION seconds so a
+# slow older upload never replaces a newer one
+IMAGE_STAGING_DIR = os.path.join(BASE_DIR, 'image_staging')
+IMAGE_JOB_WORKER_COUNT = 1
+IMAGE_JOB_POLL_INTERVAL = 1.0
+IMAGE_JOB_RETENTION = 24 * 60 * 60
+
+# Uploads are stored under the SHA-256 of their bytes, so their URLs can be
+# cached by browsers and proxies for this many seconds without revalidation
+IMAGE_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Media is served by store.media.serve_media in every environment. Behind
+# nginx set MEDIA_SENDFILE = 'x-accel-redirect' and map MEDIA_ACCEL_PREFIX
+# to MEDIA_ROOT in an internal location:
+#     location /protected-media/ { internal; alias /path/to/media/; }
+# Behind Apache with mod_xsendfile use 'x-sendfile'. None streams the file
+# from Django, with Range support, using the server's sendfile() if it has it
+MEDIA_SENDFILE = None
+MEDIA_ACCEL_PREFIX = '/protected-media/'
+
+# /transform/<product image>?w=&h=&fmt=&q= renders sizes on demand. Results
+# are kept in this directory, least recently used first out once it grows
+# past IMAGE_TRANSFORM_CACHE_BYTES
+IMAGE_TRANSFORM_CACHE_DIR = os.path.join(BASE_DIR, 'image_cache')
+IMAGE_TRANSFORM_CACHE_BYTES = 512 * 1024 * 1024
+# The endpoint is public, so only these widths/heights (pixels) and
+# qualities are rendered; anything else would let a client fill the cache
+# and the render pool with one-off sizes
+IMAGE_TRANSFORM_SIZES = [80, 160, 240, 320, 400, 480, 640, 800, 1000, 1280, 1600]
+IMAGE_TRANSFORM_QUALITIES = [50, 65, 80, 90]
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
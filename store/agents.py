@@ -0,0 +1,586 @@
+"""Background agents that apply queued work to the ontology"""
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from rdflib import URIRef, Literal
+from rdflib.namespace import RDF, XSD
+
+from .analysis import analyze_batch
+from .images import (
+    InvalidImage, delete_unreferenced_images, discard_staged, generate_variants, image_placeholder,
+    publish_file, stage_upload, validate_image
+)
+from .models import (
+    Feedback, FeedbackAnalysis, FeedbackAnalysisState, FeedbackKeyword, FeedbackOutbox,
+    IdempotencyKey, ImageJob, OrderEvent, OrderIndex
+)
+from .indexes import (
+    add_product_ratings, add_references, adjust_stock, record_cancellations, record_orders,
+    remove_references
+)
+from .ontology import ECOM_NS, graph_lock, load_graph, locked_graph, write_graph
+
+
+class QueueAgent:
+    """Polling loop shared by the agents; subclasses implement run_once()"""
+    # Seconds between maintain() passes, on the monotonic clock
+    maintain_every = timedelta(minutes=5)
+    _next_maintenance = 0.0
+
+    def run_once(self):
+        raise NotImplementedError
+
+    def maintain(self):
+        """Periodic housekeeping, e.g. requeueing abandoned work; subclasses override"""
+
+    def maintain_if_due(self):
+        """Run maintain() at most once every maintain_every; call it from run_once()"""
+        now = time.monotonic()
+        if now < self._next_maintenance:
+            return
+        self._next_maintenance = now + self.maintain_every.total_seconds()
+        self.maintain()
+
+    def run(self, stop_event, poll_interval=1.0, drain=False):
+        try:
+            while not stop_event.is_set():
+                try:
+                    processed = self.run_once()
+                except Exception as e:
+                    # A locked database or a failed graph save must not kill
+                    # the worker; maintain() requeues what the batch claimed
+                    print(f"Error in {type(self).__name__}: {e}")
+                    connection.close_if_unusable_or_obsolete()
+                    if drain:
+                        break
+                    stop_event.wait(poll_interval)
+                    continue
+                if not processed:
+                    if drain:
+                        break
+                    stop_event.wait(poll_interval)
+        finally:
+            connection.close()
+
+
+class InventoryManagementAgent(QueueAgent):
+    """Turns queued order events into Order individuals and stock updates.
+
+    Each claimed batch is applied to the graph under the writer lock and
+    persisted with a single save, so order requests never wait on
+    serialization.
+    """
+    def __init__(self, batch_size=100, stale_after=timedelta(minutes=10)):
+        self.batch_size = batch_size
+        self.stale_after = stale_after
+
+    def requeue_stale(self):
+        """Return events abandoned by a crashed worker to the queue"""
+        cutoff = timezone.now() - self.stale_after
+        return OrderEvent.objects.filter(
+            status=OrderEvent.PROCESSING, claimed_at__lt=cutoff
+        ).update(status=OrderEvent.QUEUED)
+
+    def prune_idempotency_keys(self, ttl):
+        """Forget idempotency keys older than ttl seconds"""
+        cutoff = timezone.now() - timedelta(seconds=ttl)
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+        return deleted
+
+    def maintain(self):
+        """Requeue events a dead worker left holding stock, and forget expired keys"""
+        requeued = self.requeue_stale()
+        if requeued:
+            print(f"Requeued {requeued} stale order events")
+        self.prune_idempotency_keys(settings.ORDER_IDEMPOTENCY_TTL)
+
+    def claim_batch(self):
+        with transaction.atomic():
+            ids = list(
+                OrderEvent.objects.filter(status=OrderEvent.QUEUED)
+                .order_by('id').values_list('id', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return []
+            OrderEvent.objects.filter(id__in=ids).update(
+                status=OrderEvent.PROCESSING,
+                attempts=F('attempts') + 1,
+                claimed_at=timezone.now(),
+            )
+        return list(OrderEvent.objects.filter(id__in=ids).order_by('id'))
+
+    def apply_event(self, graph, event):
+        """Add the order individual and decrement stock for one event.
+
+        Returns the OrderIndex row describing the order.
+        """
+        order = URIRef(ECOM_NS + event.order_id)
+        product = URIRef(ECOM_NS + event.product_id)
+        index_row = OrderIndex(
+            order_id=event.order_id,
+            customer=event.customer,
+            product_id=event.product_id,
+            product_name=event.product_name or str(graph.value(product, ECOM_NS.name)
+                                                   or "Unknown Product"),
+            unit_price=event.unit_price,
+            discount=event.discount,
+            quantity=event.quantity,
+            price=event.price,
+            status="pending",
+            order_date=event.order_date,
+        )
+        if (order, RDF.type, ECOM_NS.Order) in graph:
+            # Already applied by an attempt that died before marking it done
+            return index_row
+
+        stock = graph.value(product, ECOM_NS.stockLevel)
+        if stock is None:
+            raise ValueError(f"Product {event.product_id} no longer exists")
+        stock = int(stock)
+        if stock < event.quantity:
+            raise ValueError(f"Insufficient stock. Only {stock} available")
+
+        order_data = [
+            (RDF.type, ECOM_NS.Order),
+            (ECOM_NS.customer, Literal(event.customer, datatype=XSD.string)),
+            (ECOM_NS.product, product),
+            (ECOM_NS.quantity, Literal(event.quantity, datatype=XSD.integer)),
+            (ECOM_NS.price, Literal(event.price, datatype=XSD.float)),
+            (ECOM_NS.productName, Literal(index_row.product_name, datatype=XSD.string)),
+            (ECOM_NS.discount, Literal(event.discount, datatype=XSD.float)),
+            (ECOM_NS.status, Literal("pending", datatype=XSD.string)),
+            (ECOM_NS.orderDate, Literal(timezone.make_naive(event.order_date).isoformat(),
+                                        datatype=XSD.dateTime))
+        ]
+        if event.unit_price is not None:
+            order_data.append((ECOM_NS.unitPrice, Literal(event.unit_price, datatype=XSD.float)))
+        for predicate, obj in order_data:
+            graph.add((order, predicate, obj))
+
+        graph.set((product, ECOM_NS.stockLevel, Literal(stock - event.quantity)))
+        return index_row
+
+    def process_batch(self, events):
+        applied, failed = [], {}
+        with locked_graph() as graph:
+            for event in events:
+                try:
+                    applied.append((event.id, self.apply_event(graph, event)))
+                except Exception as e:
+                    print(f"Error processing order {event.order_id}: {e}")
+                    failed[event.id] = str(e)
+
+        with transaction.atomic():
+            new_rows = record_orders([row for _, row in applied])
+            # Stock leaves the index as the reservation is released, so
+            # readers of both never see it taken twice; rows a retried batch
+            # already indexed were already taken
+            taken = defaultdict(int)
+            for row in new_rows:
+                taken[row.product_id] -= row.quantity
+            adjust_stock(taken)
+            add_references(
+                (ECOM_NS[row.order_id], ECOM_NS.product, ECOM_NS[row.product_id])
+                for _, row in applied
+            )
+            OrderEvent.objects.filter(id__in=[event_id for event_id, _ in applied]).update(
+                status=OrderEvent.DONE, processed_at=timezone.now()
+            )
+            for event_id, error in failed.items():
+                OrderEvent.objects.filter(id=event_id).update(
+                    status=OrderEvent.FAILED, last_error=error, processed_at=timezone.now()
+                )
+        return len(applied), len(failed)
+
+    def transition_orders(self, order_ids, new_status):
+        """Move orders to new_status in one graph update and one save.
+
+        Orders whose current status does not allow the transition are
+        skipped. Cancelling an order returns its quantity to stock in the
+        same write. The index is brought up to date from its own rows, so a
+        retry after a crash between the graph save and the index update
+        still finishes orders the graph already moved. Returns the ids that
+        were transitioned.
+        """
+        transitioned, converged, restocked = [], [], {}
+        with locked_graph() as graph:
+            for order_id in order_ids:
+                order = URIRef(ECOM_NS + order_id)
+                status = str(graph.value(order, ECOM_NS.status) or "")
+                if status == new_status:
+                    converged.append(order_id)
+                    continue
+                if new_status not in OrderIndex.TRANSITIONS.get(status, ()):
+                    continue
+
+                if new_status == 'cancelled':
+                    product = graph.value(order, ECOM_NS.product)
+                    quantity = int(graph.value(order, ECOM_NS.quantity) or 0)
+                    stock = graph.value(product, ECOM_NS.stockLevel) if product else None
+                    if stock is not None:
+                        restocked[product] = restocked.get(product, int(stock)) + quantity
+
+                graph.set((order, ECOM_NS.status, Literal(new_status, datatype=XSD.string)))
+                transitioned.append(order_id)
+
+            for product, stock in restocked.items():
+                graph.set((product, ECOM_NS.stockLevel, Literal(stock)))
+
+        # Index rows still behind the graph, whether moved just now or by an
+        # attempt that died before reaching this transaction
+        pending = transitioned + converged
+        caught_up, returned = set(), defaultdict(int)
+        with transaction.atomic():
+            for start in range(0, len(pending), 500):
+                rows = list(OrderIndex.objects.filter(
+                    order_id__in=pending[start:start + 500]
+                ).exclude(status=new_status))
+                OrderIndex.objects.filter(id__in=[row.id for row in rows]).update(
+                    status=new_status
+                )
+                caught_up.update(row.order_id for row in rows)
+                if new_status == 'cancelled':
+                    record_cancellations(rows)
+                    for row in rows:
+                        returned[row.product_id] += row.quantity
+            adjust_stock(returned)
+        return transitioned + [order_id for order_id in converged if order_id in caught_up]
+
+    def run_once(self):
+        """Process one batch, returning the number of events claimed"""
+        self.maintain_if_due()
+        events = self.claim_batch()
+        if events:
+            self.process_batch(events)
+        return len(events)
+
+
+class FeedbackProjectionAgent(QueueAgent):
+    """Projects the Feedback table into the ontology from the FeedbackOutbox.
+
+    Each outbox entry only says which feedback changed. The agent copies the
+    row's current state (or its absence) into the graph, so a batch of any
+    size costs one graph save and replays converge on the same result.
+    """
+    def __init__(self, batch_size=200, stale_after=timedelta(minutes=10), max_attempts=5):
+        self.batch_size = batch_size
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+
+    @staticmethod
+    def feedback_triples(feedback):
+        """The (predicate, object) pairs describing feedback in the ontology"""
+        triples = [
+            (RDF.type, ECOM_NS.Feedback),
+            (ECOM_NS.feedbackUser, Literal(feedback.user, datatype=XSD.string)),
+            (ECOM_NS.userEmail, Literal(feedback.email, datatype=XSD.string)),
+            (ECOM_NS.rating, Literal(feedback.rating, datatype=XSD.integer)),
+            (ECOM_NS.comment, Literal(feedback.comment, datatype=XSD.string)),
+            (ECOM_NS.moderationStatus, Literal(feedback.moderation, datatype=XSD.string)),
+            (ECOM_NS.submissionDate, Literal(timezone.make_naive(feedback.created_at).isoformat(),
+                                             datatype=XSD.dateTime)),
+        ]
+        if feedback.product_id:
+            triples.append((ECOM_NS.aboutProduct, URIRef(ECOM_NS + feedback.product_id)))
+        return triples
+
+    def claim_batch(self):
+        cutoff = timezone.now() - self.stale_after
+        with transaction.atomic():
+            ids = list(
+                FeedbackOutbox.objects.filter(
+                    Q(claimed_at__isnull=True) | Q(claimed_at__lt=cutoff),
+                    attempts__lt=self.max_attempts,
+                ).order_by('id').values_list('id', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return []
+            FeedbackOutbox.objects.filter(id__in=ids).update(
+                attempts=F('attempts') + 1, claimed_at=timezone.now()
+            )
+        return list(FeedbackOutbox.objects.filter(id__in=ids).order_by('id'))
+
+    def process_batch(self, entries):
+        feedback_ids = list(dict.fromkeys(entry.feedback_id for entry in entries))
+        failed, references = {}, []
+        with locked_graph() as graph:
+            # Read the rows under the writer lock so the newest state wins
+            feedbacks = Feedback.objects.in_bulk(feedback_ids)
+            for feedback_id in feedback_ids:
+                feedback_uri = URIRef(ECOM_NS + str(feedback_id))
+                try:
+                    graph.remove((feedback_uri, None, None))
+                    feedback = feedbacks.get(feedback_id)
+                    if feedback is not None:
+                        triples = [(feedback_uri, predicate, obj)
+                                   for predicate, obj in self.feedback_triples(feedback)]
+                        for triple in triples:
+                            graph.add(triple)
+                        references.extend(triples)
+                except Exception as e:
+                    print(f"Error projecting feedback {feedback_id}: {e}")
+                    failed[feedback_id] = str(e)
+
+        with transaction.atomic():
+            remove_references(URIRef(ECOM_NS + str(feedback_id)) for feedback_id in feedback_ids
+                              if feedback_id not in failed)
+            add_references(references)
+            done = [entry.id for entry in entries if entry.feedback_id not in failed]
+            FeedbackOutbox.objects.filter(id__in=done).delete()
+            for feedback_id, error in failed.items():
+                FeedbackOutbox.objects.filter(
+                    id__in=[entry.id for entry in entries if entry.feedback_id == feedback_id]
+                ).update(claimed_at=None, last_error=error)
+        return len(done), len(failed)
+
+    def run_once(self):
+        """Project one batch, returning the number of entries claimed"""
+        entries = self.claim_batch()
+        if entries:
+            self.process_batch(entries)
+        return len(entries)
+
+
+class FeedbackManagementAgent(QueueAgent):
+    """Carries out the CollectFeedback task: scores and tags feedback comments.
+
+    Feedback is read in (created_at, id) order from the watermark stored in
+    FeedbackAnalysisState, so each pass costs as much as the feedback
+    submitted since the previous one. Feedback younger than settle is left
+    for the next pass, as a transaction that stamped it earlier may not have
+    committed yet. Deleting feedback deletes its analysis with it.
+    """
+    def __init__(self, batch_size=500, settle=timedelta(seconds=10)):
+        self.batch_size = batch_size
+        self.settle = settle
+
+    MODERATION_ACTIONS = ('approve', 'hide', 'delete')
+
+    def unanalyzed(self):
+        feedbacks = Feedback.objects.filter(created_at__lte=timezone.now() - self.settle)
+        state = FeedbackAnalysisState.objects.filter(pk=1).first()
+        if state and state.analyzed_through:
+            feedbacks = feedbacks.filter(
+                Q(created_at__gt=state.analyzed_through)
+                | Q(created_at=state.analyzed_through, id__gt=state.analyzed_through_id)
+            )
+        else:
+            # First run, or feedback analyzed before the watermark existed
+            feedbacks = feedbacks.filter(analysis__isnull=True)
+        return list(feedbacks.order_by('created_at', 'id')[:self.batch_size])
+
+    def run_once(self):
+        """Analyze one batch, returning the number of feedback rows analyzed"""
+        feedbacks = self.unanalyzed()
+        if feedbacks:
+            analyses, terms = analyze_batch(feedbacks)
+            with transaction.atomic():
+                FeedbackAnalysis.objects.bulk_create(analyses)
+                FeedbackKeyword.objects.bulk_create(terms)
+                FeedbackAnalysisState.objects.update_or_create(pk=1, defaults={
+                    'analyzed_through': feedbacks[-1].created_at,
+                    'analyzed_through_id': feedbacks[-1].id,
+                })
+        return len(feedbacks)
+
+    def moderate(self, feedback_ids, action):
+        """Approve, hide or delete feedback in one transaction and one graph save.
+
+        Product ratings follow the change: hidden and deleted reviews stop
+        counting, approved ones count again. The outbox entries are written
+        already claimed and projected right away, so the ontology is updated
+        once for the whole selection. If that projection fails, the entries
+        go stale and the projector retries them later. Returns the number of
+        feedback entries changed.
+        """
+        if action not in self.MODERATION_ACTIONS:
+            raise ValueError(f"Unknown moderation action {action}")
+        now = timezone.now()
+        changed, entries = [], []
+        with transaction.atomic():
+            for start in range(0, len(feedback_ids), 500):
+                chunk = Feedback.objects.filter(id__in=feedback_ids[start:start + 500])
+                if action == 'delete':
+                    rows = list(chunk.only('id', 'product_id', 'rating', 'moderation'))
+                    add_product_ratings(rows, sign=-1)
+                    chunk.delete()
+                elif action == 'hide':
+                    rows = list(chunk.exclude(moderation=Feedback.HIDDEN)
+                                .only('id', 'product_id', 'rating', 'moderation'))
+                    add_product_ratings(rows, sign=-1)
+                    chunk.filter(id__in=[row.id for row in rows]).update(moderation=Feedback.HIDDEN)
+                else:
+                    rows = list(chunk.exclude(moderation=Feedback.APPROVED)
+                                .only('id', 'product_id', 'rating', 'moderation'))
+                    unhidden = [row for row in rows if row.moderation == Feedback.HIDDEN]
+                    for row in unhidden:
+                        row.moderation = Feedback.APPROVED
+                    add_product_ratings(unhidden)
+                    chunk.filter(id__in=[row.id for row in rows]).update(moderation=Feedback.APPROVED)
+                changed.extend(row.id for row in rows)
+            entries = FeedbackOutbox.objects.bulk_create(
+                FeedbackOutbox(feedback_id=feedback_id, claimed_at=now, attempts=1)
+                for feedback_id in changed
+            )
+
+        if entries:
+            FeedbackProjectionAgent().process_batch(entries)
+        return len(changed)
+
+
+class ImageProcessingAgent(QueueAgent):
+    """Publishes staged product image uploads queued as ImageJobs.
+
+    Each job's file is validated, stored by content hash with its resized
+    variants, and then becomes the product's hasImage. Products show their
+    previous (or the default) image until then.
+    """
+    def __init__(self, batch_size=5, stale_after=timedelta(minutes=10), max_attempts=3):
+        self.batch_size = batch_size
+        self.stale_after = stale_after
+        self.max_attempts = max_attempts
+
+    @staticmethod
+    def enqueue(product_id, upload):
+        """Stage an uploaded image and queue the job that publishes it.
+
+        The staged file is removed again if the job cannot be created, as
+        nothing else would ever reference it.
+        """
+        staged_name = stage_upload(upload)
+        try:
+            return ImageJob.objects.create(product_id=product_id, staged_name=staged_name,
+                                           original_name=upload.name)
+        except Exception:
+            discard_staged(staged_name)
+            raise
+
+    def requeue_stale(self):
+        """Return jobs abandoned by a crashed worker to the queue"""
+        cutoff = timezone.now() - self.stale_after
+        return ImageJob.objects.filter(
+            status=ImageJob.PROCESSING, claimed_at__lt=cutoff
+        ).update(status=ImageJob.QUEUED)
+
+    def prune_finished(self, ttl):
+        """Forget jobs that finished more than ttl seconds ago"""
+        cutoff = timezone.now() - timedelta(seconds=ttl)
+        deleted, _ = ImageJob.objects.filter(
+            status__in=[ImageJob.DONE, ImageJob.FAILED], finished_at__lt=cutoff
+        ).delete()
+        return deleted
+
+    def maintain(self):
+        """Requeue jobs a dead worker abandoned and forget long finished ones"""
+        requeued = self.requeue_stale()
+        if requeued:
+            print(f"Requeued {requeued} stale image jobs")
+        self.prune_finished(settings.IMAGE_JOB_RETENTION)
+
+    def claim_batch(self):
+        with transaction.atomic():
+            ids = list(
+                ImageJob.objects.filter(status=ImageJob.QUEUED)
+                .order_by('id').values_list('id', flat=True)[:self.batch_size]
+            )
+            if not ids:
+                return []
+            ImageJob.objects.filter(id__in=ids).update(
+                status=ImageJob.PROCESSING,
+                attempts=F('attempts') + 1,
+                claimed_at=timezone.now(),
+            )
+        return list(ImageJob.objects.filter(id__in=ids).order_by('id'))
+
+    def publish(self, job, image_name, placeholder):
+        """Point the product at image_name and its placeholder unless a newer upload got there first.
+
+        Returns False when the image was not used: the product is gone, or a
+        later job for it is queued or already done.
+        """
+        image = Literal(image_name, datatype=XSD.string)
+        product = URIRef(ECOM_NS + job.product_id)
+        with graph_lock():
+            graph = load_graph()
+            superseded = ImageJob.objects.filter(
+                product_id=job.product_id, id__gt=job.id
+            ).exclude(status=ImageJob.FAILED).exists()
+            if superseded or (product, RDF.type, ECOM_NS.Product) not in graph:
+                delete_unreferenced_images(graph, [image])
+                return False
+            previous = graph.value(product, ECOM_NS.hasImage)
+            graph.set((product, ECOM_NS.hasImage, image))
+            graph.set((product, ECOM_NS.imagePlaceholder, Literal(placeholder, datatype=XSD.string)))
+            write_graph(graph)
+            delete_unreferenced_images(graph, [previous])
+        return True
+
+    def finish(self, job, status, image='', error=''):
+        ImageJob.objects.filter(id=job.id).update(
+            status=status, image=image, last_error=error, finished_at=timezone.now()
+        )
+        staged = os.path.join(settings.IMAGE_STAGING_DIR, job.staged_name)
+        if os.path.exists(staged):
+            os.remove(staged)
+
+    def process_job(self, job):
+        staged = os.path.join(settings.IMAGE_STAGING_DIR, job.staged_name)
+        try:
+            extension = validate_image(staged)
+            placeholder = image_placeholder(staged)
+            image_name, created = publish_file(staged, extension)
+            if created:
+                generate_variants(image_name)
+            published = self.publish(job, image_name, placeholder)
+            self.finish(job, ImageJob.DONE, image=image_name if published else '')
+        except InvalidImage as e:
+            print(f"Rejected image {job.original_name} for {job.product_id}: {e}")
+            self.finish(job, ImageJob.FAILED, error=str(e))
+        except Exception as e:
+            print(f"Error processing image {job.original_name} for {job.product_id}: {e}")
+            if job.attempts >= self.max_attempts:
+                self.finish(job, ImageJob.FAILED, error=str(e))
+            else:
+                ImageJob.objects.filter(id=job.id).update(
+                    status=ImageJob.QUEUED, claimed_at=None, last_error=str(e)
+                )
+
+    def run_once(self):
+        """Process one batch, returning the number of jobs claimed"""
+        self.maintain_if_due()
+        jobs = self.claim_batch()
+        for job in jobs:
+            self.process_job(job)
+        return len(jobs)
+
+
+def run_agent_pool(agent_class, workers, stop_event=None, poll_interval=1.0,
+                   drain=False, **agent_kwargs):
+    """Run `workers` agents in threads until stopped (or drained)"""
+    stop_event = stop_event or threading.Event()
+    threads = [
+        threading.Thread(
+            target=agent_class(**agent_kwargs).run,
+            args=(stop_event, poll_interval, drain),
+            name=f"{agent_class.__name__}-{i}",
+            daemon=True,
+        )
+        for i in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    try:
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+    except KeyboardInterrupt:
+        stop_event.set()
+        for thread in threads:
+            thread.join()
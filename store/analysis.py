@@ -0,0 +1,143 @@
+"""Offline sentiment scoring and keyword extraction for feedback comments"""
+import math
+import re
+from collections import Counter
+
+from django.db.models import Avg, Count
+from django.utils import timezone
+
+from .models import Feedback, FeedbackAnalysis, FeedbackAnalysisState, FeedbackKeyword
+
+TOKEN_RE = re.compile(r"[a-z]+(?:'[a-z]+)?|[.,;:!?]")
+CLAUSE_BREAKS = set('.,;:!?')
+
+# Word valences on a -3..3 scale, in the spirit of the AFINN word list
+LEXICON = {
+    'amazing': 3, 'awesome': 3, 'excellent': 3, 'fantastic': 3, 'love': 3, 'loved': 3,
+    'outstanding': 3, 'perfect': 3, 'superb': 3, 'wonderful': 3,
+    'best': 2, 'easy': 2, 'efficient': 2, 'enjoy': 2, 'enjoyed': 2, 'fast': 2, 'friendly': 2,
+    'glad': 2, 'good': 2, 'great': 2, 'happy': 2, 'helpful': 2, 'impressed': 2, 'modern': 1,
+    'nice': 2, 'pleasant': 2, 'pleased': 2, 'quick': 2, 'recommend': 2, 'reliable': 2,
+    'satisfied': 2, 'smooth': 2, 'thanks': 2, 'useful': 2,
+    'clean': 1, 'fine': 1, 'like': 1, 'okay': 1, 'simple': 1, 'worth': 1,
+    'annoying': -2, 'bad': -2, 'broken': -2, 'confusing': -2, 'delay': -1, 'delayed': -2,
+    'difficult': -1, 'disappointed': -2, 'disappointing': -2, 'expensive': -1, 'fault': -2,
+    'faulty': -2, 'hard': -1, 'late': -1, 'missing': -2, 'poor': -2, 'problem': -2,
+    'problems': -2, 'slow': -2, 'unhappy': -2, 'wrong': -2,
+    'awful': -3, 'hate': -3, 'horrible': -3, 'refund': -1, 'scam': -3, 'terrible': -3,
+    'useless': -3, 'worst': -3,
+}
+NEGATIONS = {'not', 'no', 'never', "don't", "didn't", "doesn't", "isn't", "wasn't", 'cannot', "can't"}
+INTENSIFIERS = {'very': 1.5, 'really': 1.5, 'extremely': 2.0, 'so': 1.3, 'too': 1.3}
+STOPWORDS = {
+    'a', 'about', 'after', 'all', 'also', 'am', 'an', 'and', 'any', 'are', 'as', 'at', 'be',
+    'because', 'been', 'but', 'by', 'can', 'could', 'did', 'do', 'for', 'from', 'get', 'got',
+    'had', 'has', 'have', 'he', 'her', 'here', 'his', 'how', 'i', "i'm", 'if', 'in', 'into',
+    'is', 'it', "it's", 'its', 'just', 'make', 'makes', 'me', 'more', 'most', 'much', 'my',
+    'of', 'on', 'one', 'only', 'or', 'other', 'our', 'out', 'overall', 'really', 'she', 'so',
+    'some', 'than', 'that', 'the', 'their', 'them', 'then', 'there', 'these', 'they', 'this',
+    'to', 'too', 'up', 'us', 'very', 'was', 'we', 'were', 'what', 'when', 'which', 'while',
+    'who', 'will', 'with', 'would', 'you', 'your',
+} | NEGATIONS
+
+POSITIVE_THRESHOLD = 0.05
+KEYWORDS_PER_FEEDBACK = 5
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or "").lower())
+
+
+def sentiment_score(tokens):
+    """Lexicon sentiment of a token list, normalized to -1..1.
+
+    A negation flips the valence of the next three words of its clause and
+    an intensifier scales the word that follows it.
+    """
+    total, negate_for, boost = 0.0, 0, 1.0
+    for token in tokens:
+        if token in CLAUSE_BREAKS:
+            negate_for, boost = 0, 1.0
+            continue
+        if token in NEGATIONS:
+            negate_for = 3
+            continue
+        if token in INTENSIFIERS:
+            boost = INTENSIFIERS[token]
+            continue
+        valence = LEXICON.get(token)
+        if valence:
+            total += valence * boost * (-0.75 if negate_for else 1)
+        boost = 1.0
+        negate_for = max(negate_for - 1, 0)
+    return total / math.sqrt(total * total + 15)
+
+
+def sentiment_label(score):
+    if score > POSITIVE_THRESHOLD:
+        return FeedbackAnalysis.POSITIVE
+    if score < -POSITIVE_THRESHOLD:
+        return FeedbackAnalysis.NEGATIVE
+    return FeedbackAnalysis.NEUTRAL
+
+
+def keywords(tokens, limit=KEYWORDS_PER_FEEDBACK):
+    """The most frequent content words of a comment, ties in order of appearance"""
+    counts = Counter(token for token in tokens if len(token) > 2 and token not in STOPWORDS)
+    return [term for term, _ in counts.most_common(limit)]
+
+
+def analyze_batch(feedbacks):
+    """Score a batch of Feedback rows, returning unsaved analysis and keyword rows"""
+    analyses, terms = [], []
+    for feedback in feedbacks:
+        tokens = tokenize(feedback.comment)
+        score = sentiment_score(tokens)
+        analyses.append(FeedbackAnalysis(
+            feedback=feedback, sentiment=score, label=sentiment_label(score)
+        ))
+        terms.extend(FeedbackKeyword(feedback=feedback, term=term) for term in keywords(tokens))
+    return analyses, terms
+
+
+def feedback_insights(top_keywords=10):
+    """Aggregates over all analyzed feedback for the admin feedback page"""
+    labels = dict(FeedbackAnalysis.objects.values_list('label').annotate(n=Count('pk')))
+    ratings = dict(Feedback.objects.values_list('rating').annotate(n=Count('pk')))
+    total = sum(ratings.values())
+    return {
+        'total': total,
+        'analyzed': sum(labels.values()),
+        'labels': [(label, labels.get(label, 0)) for label, _ in FeedbackAnalysis.LABEL_CHOICES],
+        'average_sentiment': FeedbackAnalysis.objects.aggregate(avg=Avg('sentiment'))['avg'],
+        'rating_histogram': [
+            (rating, ratings.get(rating, 0),
+             round(100 * ratings.get(rating, 0) / total) if total else 0)
+            for rating in range(5, 0, -1)
+        ],
+        'keywords': list(
+            FeedbackKeyword.objects.values('term').annotate(n=Count('pk'))
+            .order_by('-n', 'term')[:top_keywords]
+        ),
+    }
+
+
+def refresh_insights():
+    """Recompute feedback_insights() and store it for the admin feedback page"""
+    insights = feedback_insights()
+    FeedbackAnalysisState.objects.update_or_create(
+        pk=1, defaults={'insights': insights, 'insights_at': timezone.now()}
+    )
+    return insights
+
+
+def stored_insights():
+    """(insights, computed_at) stored by the last analyze_feedback run.
+
+    The admin page reads these instead of aggregating every feedback row on
+    each load; they are computed once here if the command has never run.
+    """
+    state = FeedbackAnalysisState.objects.filter(pk=1).first()
+    if state and state.insights_at:
+        return state.insights, state.insights_at
+    return refresh_insights(), timezone.now()
@@ -0,0 +1,185 @@
+"""Cold storage for delivered and cancelled orders.
+
+Archived orders leave the hot ontology and the order index and are kept as
+gzipped NDJSON files partitioned by order date:
+ORDER_ARCHIVE_DIR/orders/YYYY/MM/YYYY-MM-DD.ndjson.gz
+"""
+import gzip
+import heapq
+import json
+import os
+from collections import defaultdict
+from datetime import date, timedelta
+from itertools import islice
+from operator import attrgetter
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rdflib import URIRef
+
+from .indexes import parse_graph_datetime, remove_references
+from .models import OrderIndex
+from .ontology import ECOM_NS, locked_graph
+
+ARCHIVED_STATUSES = ('delivered', 'cancelled')
+ARCHIVE_FIELDS = [field.name for field in OrderIndex._meta.concrete_fields if field.name != 'id']
+
+
+def partition_path(day):
+    return os.path.join(settings.ORDER_ARCHIVE_DIR, 'orders', f"{day:%Y}", f"{day:%m}",
+                        f"{day.isoformat()}.ndjson.gz")
+
+
+def _record(row):
+    record = {field: getattr(row, field) for field in ARCHIVE_FIELDS}
+    record['order_date'] = row.order_date.isoformat()
+    return record
+
+
+def archive_batch(rows):
+    """Append rows to their day partitions, then drop them from the graph and the index.
+
+    The archive files are appended before the graph is saved, so a crash
+    can at worst leave an order both archived and hot; readers skip
+    duplicate order ids.
+    """
+    partitions = defaultdict(list)
+    for row in rows:
+        partitions[timezone.localdate(row.order_date)].append(_record(row))
+
+    with locked_graph() as graph:
+        for day, records in partitions.items():
+            path = partition_path(day)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with gzip.open(path, 'at', encoding='utf-8') as f:
+                for record in records:
+                    f.write(json.dumps(record) + '\n')
+        for row in rows:
+            graph.remove((URIRef(ECOM_NS + row.order_id), None, None))
+
+    order_ids = [row.order_id for row in rows]
+    with transaction.atomic():
+        OrderIndex.objects.filter(order_id__in=order_ids).delete()
+        remove_references(ECOM_NS[order_id] for order_id in order_ids)
+
+
+def archive_orders(older_than_days, batch_size=500):
+    """Move final-state orders older than the cutoff out of the hot graph.
+
+    Works through them in (order_date, order_id) batches of batch_size,
+    each with its own graph save and transaction, so memory and the time
+    the writer lock is held do not grow with the backlog. Returns the
+    number of orders archived.
+    """
+    cutoff = timezone.now() - timedelta(days=older_than_days)
+    eligible = OrderIndex.objects.filter(
+        status__in=ARCHIVED_STATUSES, order_date__lt=cutoff
+    ).order_by('order_date', 'order_id')
+    archived, position = 0, None
+    while True:
+        batch = eligible
+        if position:
+            order_date, order_id = position
+            batch = batch.filter(Q(order_date__gt=order_date)
+                                 | Q(order_date=order_date, order_id__gt=order_id))
+        rows = list(batch[:batch_size])
+        if not rows:
+            return archived
+        archive_batch(rows)
+        archived += len(rows)
+        position = (rows[-1].order_date, rows[-1].order_id)
+
+
+def archive_partitions(date_from=None, date_to=None, reverse=False):
+    """(day, path) of the partition files that exist between two dates, in day order.
+
+    Walks only the YYYY/MM directories that exist and overlap the range,
+    so a wide range over a sparse archive costs a handful of listdir calls.
+    """
+    root = os.path.join(settings.ORDER_ARCHIVE_DIR, 'orders')
+
+    def listdir(path):
+        try:
+            return os.listdir(path)
+        except FileNotFoundError:
+            return []
+
+    partitions = []
+    for year in listdir(root):
+        if not year.isdigit():
+            continue
+        if (date_from and int(year) < date_from.year) or (date_to and int(year) > date_to.year):
+            continue
+        for month in listdir(os.path.join(root, year)):
+            if not month.isdigit():
+                continue
+            if date_from and (int(year), int(month)) < (date_from.year, date_from.month):
+                continue
+            if date_to and (int(year), int(month)) > (date_to.year, date_to.month):
+                continue
+            for filename in listdir(os.path.join(root, year, month)):
+                try:
+                    day = date.fromisoformat(filename.removesuffix('.ndjson.gz'))
+                except ValueError:
+                    continue
+                if (date_from and day < date_from) or (date_to and day > date_to):
+                    continue
+                partitions.append((day, os.path.join(root, year, month, filename)))
+    partitions.sort(reverse=reverse)
+    return partitions
+
+
+def read_partition(path, status=None, customer=None):
+    """Matching orders of one partition as unsaved OrderIndex rows.
+
+    A crash during archiving can append an order twice, always to the same
+    day's partition, so duplicates are dropped here.
+    """
+    rows, seen = [], set()
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            record = json.loads(line)
+            if record['order_id'] in seen:
+                continue
+            seen.add(record['order_id'])
+            if status and record['status'] != status:
+                continue
+            if customer and record['customer'] != customer:
+                continue
+            record['order_date'] = parse_graph_datetime(record['order_date'])
+            rows.append(OrderIndex(**{key: value for key, value in record.items()
+                                      if key in ARCHIVE_FIELDS}))
+    return rows
+
+
+def iter_archived_orders(date_from=None, date_to=None, status=None, customer=None,
+                         descending=False):
+    """Stream archived orders placed between two dates, ordered by (order_date, order_id).
+
+    Only one day's partition is held in memory at a time.
+    """
+    for _, path in archive_partitions(date_from, date_to, reverse=descending):
+        rows = read_partition(path, status=status, customer=customer)
+        rows.sort(key=attrgetter('order_date', 'order_id'), reverse=descending)
+        yield from rows
+
+
+def iter_merged_orders(hot, archived, descending):
+    """Stream indexed and archived orders merged by (order_date, order_id).
+
+    hot and archived are iterables of OrderIndex rows already in that order.
+    """
+    return heapq.merge(hot, archived, key=attrgetter('order_date', 'order_id'),
+                       reverse=descending)
+
+
+def merge_orders(hot, archived, descending, limit):
+    """The first limit orders of the order index and the archive, by (order_date, order_id).
+
+    hot is a queryset and archived a stream, both already in that order;
+    the archive is only read as far as the last row returned.
+    """
+    return list(islice(iter_merged_orders(hot[:limit], islice(archived, limit), descending),
+                       limit))
@@ -0,0 +1,66 @@
+"""Streaming CSV / NDJSON exports of orders and feedback"""
+import csv
+import json
+
+from .models import Feedback, OrderIndex
+
+ORDER_FIELDS = ['order_id', 'customer', 'product_id', 'product_name', 'unit_price', 'discount',
+                'quantity', 'price', 'status', 'order_date']
+FEEDBACK_FIELDS = ['id', 'user', 'email', 'product_id', 'rating', 'comment', 'moderation',
+                   'created_at']
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+CHUNK_SIZE = 2000
+
+
+class Echo:
+    """File-like object whose write() returns the value, for csv.writer"""
+    def write(self, value):
+        return value
+
+
+def iter_orders(orders=None):
+    """Yield order rows as dicts straight from the order index"""
+    orders = OrderIndex.objects.order_by('id') if orders is None else orders
+    for values in orders.values_list(*ORDER_FIELDS).iterator(chunk_size=CHUNK_SIZE):
+        yield dict(zip(ORDER_FIELDS, values))
+
+
+def iter_order_rows(orders):
+    """Yield order rows as dicts from OrderIndex instances, e.g. archived orders"""
+    for order in orders:
+        yield {field: getattr(order, field) for field in ORDER_FIELDS}
+
+
+def iter_feedback(feedback=None):
+    """Yield feedback rows as dicts from the Feedback table"""
+    feedback = Feedback.objects.order_by('created_at') if feedback is None else feedback
+    for values in feedback.values_list(*FEEDBACK_FIELDS).iterator(chunk_size=CHUNK_SIZE):
+        yield dict(zip(FEEDBACK_FIELDS, values))
+
+
+def _text(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def csv_lines(rows, fields):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([_text(row[field]) for field in fields])
+
+
+def ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps({key: _text(value) for key, value in row.items()}, default=str) + '\n'
+
+
+def export_lines(rows, fields, export_format):
+    """Encode rows lazily in the requested format"""
+    if export_format == 'csv':
+        return csv_lines(rows, fields)
+    if export_format == 'ndjson':
+        return ndjson_lines(rows)
+    raise ValueError(f"Unsupported export format: {export_format}")
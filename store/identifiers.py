@@ -0,0 +1,37 @@
+"""Time-ordered identifiers for orders and feedback"""
+import os
+import threading
+import time
+import uuid
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+
+def uuid7():
+    """Return a UUIDv7 (RFC 9562): 48-bit unix milliseconds then random bits.
+
+    A 12-bit counter seeded randomly each millisecond keeps ids generated
+    in the same millisecond in creation order, so sorting by id sorts by
+    creation time. The result is an ordinary uuid.UUID, so it is stored
+    and compared exactly like the existing uuid4 ids.
+    """
+    global _last_ms, _counter
+    with _lock:
+        now_ms = time.time_ns() // 1_000_000
+        if now_ms > _last_ms:
+            _last_ms = now_ms
+            _counter = int.from_bytes(os.urandom(2), 'big') & 0x7FF
+        else:
+            _counter += 1
+            if _counter > 0xFFF:
+                # Counter exhausted: borrow the next millisecond
+                _last_ms += 1
+                _counter = 0
+        timestamp_ms, counter = _last_ms, _counter
+
+    rand_b = int.from_bytes(os.urandom(8), 'big') & ((1 << 62) - 1)
+    value = (timestamp_ms << 80) | (0x7 << 76) | (counter << 64) | (0b10 << 62) | rand_b
+    return uuid.UUID(int=value)
+
@@ -0,0 +1,312 @@
+"""Content addressed product images and their resized, recompressed variants"""
+import base64
+import hashlib
+import io
+import os
+import posixpath
+import re
+import shutil
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.move import file_move_safe
+from PIL import Image, ImageOps
+
+from .ontology import ECOM_NS
+
+IMAGE_DIR = 'product_images'
+DEFAULT_IMAGE = 'default_image.jpg'
+# Formats accepted from uploads, and the extension each is published under
+IMAGE_FORMATS = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp', 'GIF': '.gif'}
+# product_images/ab/<sha256>.<ext> and its variants/<sha256>-<width>.<ext>:
+# the name changes whenever the bytes do, so these never go stale in a cache
+CONTENT_NAME_RE = re.compile(r'product_images/[0-9a-f]{2}/(variants/)?[0-9a-f]{64}[.-][\w.]+')
+
+# Encoder settings per variant format; nothing is passed for exif/icc so
+# camera metadata never reaches the published files
+VARIANT_FORMATS = {
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', 'jpg', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+VARIANT_DIR = 'variants'
+# Output formats of the on-demand transform endpoint; quality is per request
+TRANSFORM_FORMATS = {
+    'webp': ('WEBP', {'method': 4}),
+    'jpeg': ('JPEG', {'optimize': True, 'progressive': True}),
+    'png': ('PNG', {'optimize': True}),
+}
+
+# Longest side of the inline placeholder, in pixels; browsers smooth it
+# when scaling it up, which gives the blur for free
+PLACEHOLDER_SIZE = 16
+PLACEHOLDER_QUALITY = 40
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def media_name(image_name):
+    """hasImage values saved on Windows use backslashes; media paths use /"""
+    return image_name.replace('\\', '/')
+
+
+class InvalidImage(ValueError):
+    """A staged upload that is not an image we publish; retrying cannot help"""
+
+
+def stage_upload(upload):
+    """Move an upload into IMAGE_STAGING_DIR and return its staged file name.
+
+    Large uploads already sit in a temporary file, which is moved rather
+    than copied; small in-memory ones are written out.
+    """
+    os.makedirs(settings.IMAGE_STAGING_DIR, exist_ok=True)
+    staged_name = f"{uuid.uuid4().hex}.upload"
+    path = os.path.join(settings.IMAGE_STAGING_DIR, staged_name)
+    if hasattr(upload, 'temporary_file_path'):
+        file_move_safe(upload.temporary_file_path(), path)
+    else:
+        with open(path, 'wb') as f:
+            for chunk in upload.chunks():
+                f.write(chunk)
+    return staged_name
+
+
+def discard_staged(staged_name):
+    """Delete a staged upload that no ImageJob will pick up"""
+    path = os.path.join(settings.IMAGE_STAGING_DIR, staged_name)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def validate_image(path):
+    """Check that path holds a complete image in a published format.
+
+    Returns the file extension for its real format, whatever the upload
+    was called. Raises InvalidImage otherwise; oversized images trip
+    Pillow's decompression bomb check.
+    """
+    try:
+        with Image.open(path) as image:
+            image_format = image.format
+            image.verify()
+        # verify() leaves the image unusable, and misses truncated pixel data
+        with Image.open(path) as image:
+            image.load()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+        raise InvalidImage(f"Not a readable image: {e}") from e
+    if image_format not in IMAGE_FORMATS:
+        raise InvalidImage(f"Unsupported image format: {image_format}")
+    return IMAGE_FORMATS[image_format]
+
+
+def publish_file(path, extension):
+    """Copy a validated file into media under the SHA-256 of its bytes.
+
+    Returns (name, created); created is False when identical bytes were
+    already published, e.g. the same picture uploaded for another product.
+    The source is left in place so a failed job can be retried.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    content_hash = digest.hexdigest()
+    name = posixpath.join(IMAGE_DIR, content_hash[:2], content_hash + extension)
+    target = os.path.join(settings.MEDIA_ROOT, name)
+    if os.path.exists(target):
+        return name, False
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    temporary = f"{target}.{os.getpid()}.tmp"
+    shutil.copyfile(path, temporary)
+    os.replace(temporary, target)
+    return name, True
+
+
+def is_immutable(name):
+    return CONTENT_NAME_RE.fullmatch(media_name(name)) is not None
+
+
+def delete_unreferenced_images(graph, images):
+    """Delete the files of the hasImage literals in images that no product uses any more.
+
+    Call with the graph as saved, under the writer lock, so a concurrent
+    save cannot add a reference between the check and the delete.
+    """
+    for image in images:
+        if image is None or str(image) == DEFAULT_IMAGE:
+            continue
+        if next(graph.subjects(ECOM_NS.hasImage, image), None) is not None:
+            continue
+        path = os.path.join(settings.MEDIA_ROOT, media_name(str(image)))
+        if os.path.exists(path):
+            os.remove(path)
+        delete_variants(str(image))
+
+
+def variant_name(image_name, width, fmt):
+    """Media relative path of the fmt variant of image_name at width pixels"""
+    directory, filename = posixpath.split(media_name(image_name))
+    stem = posixpath.splitext(filename)[0]
+    extension = VARIANT_FORMATS[fmt][1]
+    return posixpath.join(directory, VARIANT_DIR, f"{stem}-{width}.{extension}")
+
+
+def variant_widths():
+    return sorted(set(settings.IMAGE_VARIANTS.values()))
+
+
+def open_upright(path):
+    """Decode path as RGB, or RGBA when it has transparency, in its EXIF orientation"""
+    with Image.open(path) as source:
+        # Apply the EXIF orientation before the tag is dropped
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+    return image
+
+
+def flatten(image):
+    """image on a white background, for encoders or uses without an alpha channel"""
+    if image.mode != 'RGBA':
+        return image
+    flattened = Image.new('RGB', image.size, 'white')
+    flattened.paste(image, mask=image.getchannel('A'))
+    return flattened
+
+
+def save_image(image, path, encoder, options):
+    """Encode image to path without metadata, replacing it atomically"""
+    if encoder == 'JPEG':
+        image = flatten(image)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write beside the target and rename so readers never see half a file
+    temporary = f"{path}.{os.getpid()}.tmp"
+    image.save(temporary, encoder, **options)
+    os.replace(temporary, path)
+
+
+def render_variant(media_root, image_name, width):
+    """Write every format of one width of image_name, returning the names written.
+
+    Runs in a worker process, so it only takes plain arguments.
+    """
+    image = open_upright(os.path.join(media_root, media_name(image_name)))
+    # Never upscale: a small upload keeps its own size in the larger variants
+    if image.width > width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.Resampling.LANCZOS)
+
+    written = []
+    for fmt, (encoder, _, options) in VARIANT_FORMATS.items():
+        name = variant_name(image_name, width, fmt)
+        save_image(image, os.path.join(media_root, name), encoder, options)
+        written.append(name)
+    return written
+
+
+def render_transform(source_path, target_path, width, height, fmt, quality):
+    """Resize source_path for the transform endpoint and encode it to target_path.
+
+    With both width and height the image is scaled and centre cropped to
+    fill the box; with one it is scaled to that size, never upscaled.
+    """
+    image = open_upright(source_path)
+    if width and height:
+        image = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+    elif width or height:
+        scale = min(1, width / image.width if width else height / image.height)
+        size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+        if size != image.size:
+            image = image.resize(size, Image.Resampling.LANCZOS)
+    encoder, options = TRANSFORM_FORMATS[fmt]
+    if encoder != 'PNG':
+        options = {**options, 'quality': quality}
+    save_image(image, target_path, encoder, options)
+
+
+def image_placeholder(path):
+    """A blurry preview of path, a couple of hundred bytes as a data: URI.
+
+    Pages inline it behind the real image so a card shows the picture's
+    colours and shape before its bytes arrive.
+    """
+    image = flatten(open_upright(path))
+    image.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BOX)
+    buffer = io.BytesIO()
+    image.save(buffer, 'WEBP', quality=PLACEHOLDER_QUALITY)
+    return "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def cached_placeholder(image_name):
+    """image_placeholder of a media file that is not a product image, e.g. a banner.
+
+    Computed on first use and cached per version of the file; '' when the
+    file is missing or unreadable.
+    """
+    path = os.path.join(settings.MEDIA_ROOT, media_name(image_name))
+    try:
+        version = os.stat(path).st_mtime_ns
+    except OSError:
+        return ''
+    key = "placeholder:" + hashlib.sha1(f"{image_name}|{version}".encode()).hexdigest()
+    placeholder = cache.get(key)
+    if placeholder is None:
+        try:
+            placeholder = image_placeholder(path)
+        except Exception as e:
+            print(f"Error computing placeholder of {image_name}: {str(e)}")
+            placeholder = ''
+        cache.set(key, placeholder, None)
+    return placeholder
+
+
+def get_pool():
+    """The process pool shared by every image render in this server process"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+        return _pool
+
+
+def generate_variants(image_name):
+    """Render all variants of a stored image in the pool and wait for them.
+
+    A file Pillow cannot read leaves the original as the only copy; the
+    templates fall back to it when no variants exist.
+    """
+    futures = [
+        get_pool().submit(render_variant, settings.MEDIA_ROOT, image_name, width)
+        for width in variant_widths()
+    ]
+    written = []
+    for future in futures:
+        try:
+            written.extend(future.result())
+        except Exception as e:
+            print(f"Error generating variants of {image_name}: {str(e)}")
+    return written
+
+
+def delete_variants(image_name):
+    for width in variant_widths():
+        for fmt in VARIANT_FORMATS:
+            path = os.path.join(settings.MEDIA_ROOT, variant_name(image_name, width, fmt))
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def variant_srcset(image_name, fmt):
+    """srcset value listing the existing fmt variants of image_name, or ''"""
+    candidates = []
+    for width in variant_widths():
+        name = variant_name(image_name, width, fmt)
+        if os.path.exists(os.path.join(settings.MEDIA_ROOT, name)):
+            candidates.append(f"{settings.MEDIA_URL}{name} {width}w")
+    return ", ".join(candidates)
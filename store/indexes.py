@@ -0,0 +1,341 @@
+"""Builders for the SQLite indexes kept alongside the ontology"""
+from collections import defaultdict
+from datetime import datetime
+
+from django.conf import settings
+from django.db.models import F, Q, Sum, Count, Max, Value, DateTimeField
+from django.db.models.functions import Coalesce, Greatest, TruncDate
+from django.utils import timezone
+from rdflib import Literal, URIRef
+from rdflib.namespace import RDF
+
+from .models import (
+    CustomerOrderSummary, Feedback, ObjectReference, OrderIndex, ProductDailySales,
+    ProductIndex, ProductRating
+)
+from .ontology import ECOM_NS
+
+
+def parse_graph_datetime(value):
+    """Convert an xsd:dateTime literal into an aware datetime"""
+    value = value.toPython() if hasattr(value, 'toPython') else value
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def order_index_row(graph, order):
+    """Build the OrderIndex row for an Order individual in the graph"""
+    product = graph.value(order, ECOM_NS.product)
+    # Orders placed before snapshots existed fall back to the live product
+    product_name = (graph.value(order, ECOM_NS.productName)
+                    or graph.value(product, ECOM_NS.name) or "Unknown Product")
+    unit_price = graph.value(order, ECOM_NS.unitPrice)
+    return OrderIndex(
+        order_id=str(order).split('#')[-1],
+        customer=str(graph.value(order, ECOM_NS.customer) or "Unknown"),
+        product_id=str(product).split('#')[-1] if product else "",
+        product_name=str(product_name),
+        unit_price=float(unit_price) if unit_price is not None else None,
+        discount=float(graph.value(order, ECOM_NS.discount) or 0),
+        quantity=int(graph.value(order, ECOM_NS.quantity) or 0),
+        price=float(graph.value(order, ECOM_NS.price) or 0),
+        status=str(graph.value(order, ECOM_NS.status) or "unknown"),
+        order_date=parse_graph_datetime(graph.value(order, ECOM_NS.orderDate)),
+    )
+
+
+def iter_order_index_rows(graph):
+    for order in graph.subjects(RDF.type, ECOM_NS.Order):
+        if graph.value(order, ECOM_NS.orderDate) is None:
+            # Sample individuals from the ontology design, not placed orders
+            continue
+        try:
+            yield order_index_row(graph, order)
+        except Exception as e:
+            print(f"Error processing order {order}: {str(e)}")
+
+
+def product_index_row(graph, product):
+    """Build the ProductIndex row for a Product individual in the graph"""
+    return ProductIndex(
+        product_id=str(product).split('#')[-1],
+        name=str(graph.value(product, ECOM_NS.name) or ""),
+        price=float(graph.value(product, ECOM_NS.price) or 0),
+        discount=float(graph.value(product, ECOM_NS.discount) or 0),
+        stock_level=int(graph.value(product, ECOM_NS.stockLevel) or 0),
+        deleted=(product, ECOM_NS.deleted, Literal(True)) in graph,
+    )
+
+
+def iter_product_index_rows(graph):
+    for product in graph.subjects(RDF.type, ECOM_NS.Product):
+        try:
+            yield product_index_row(graph, product)
+        except Exception as e:
+            print(f"Error processing product {product}: {str(e)}")
+
+
+def index_products(graph, products):
+    """Copy products as they stand in the saved graph into the product index.
+
+    Products no longer in the graph are dropped from it.
+    """
+    for product in products:
+        if (product, RDF.type, ECOM_NS.Product) not in graph:
+            ProductIndex.objects.filter(product_id=str(product).split('#')[-1]).delete()
+            continue
+        row = product_index_row(graph, product)
+        ProductIndex.objects.update_or_create(
+            product_id=row.product_id,
+            defaults={field: getattr(row, field) for field in
+                      ('name', 'price', 'discount', 'stock_level', 'deleted')},
+        )
+
+
+def adjust_stock(changes):
+    """Apply {product_id: quantity} stock changes made in the graph to the product index"""
+    for product_id, change in changes.items():
+        ProductIndex.objects.filter(product_id=product_id).update(
+            stock_level=F('stock_level') + change
+        )
+
+
+def record_orders(rows):
+    """Index newly created orders and fold them into the sales rollups.
+
+    Rows that are already indexed (a retried batch) are skipped so the
+    rollups are never counted twice. Call inside a transaction.
+    """
+    existing = set(
+        OrderIndex.objects.filter(order_id__in=[row.order_id for row in rows])
+        .values_list('order_id', flat=True)
+    )
+    new_rows = [row for row in rows if row.order_id not in existing]
+    OrderIndex.objects.bulk_create(new_rows, ignore_conflicts=True)
+    add_daily_sales(new_rows)
+
+    totals = defaultdict(lambda: [0, 0.0, None])
+    for row in new_rows:
+        total = totals[row.customer]
+        total[0] += 1
+        total[1] += row.price * row.quantity
+        total[2] = max(total[2], row.order_date) if total[2] else row.order_date
+
+    for customer, (count, spent, last_date) in totals.items():
+        last_date_value = Value(last_date, output_field=DateTimeField())
+        updated = CustomerOrderSummary.objects.filter(customer=customer).update(
+            order_count=F('order_count') + count,
+            total_spent=F('total_spent') + spent,
+            last_order_date=Greatest(Coalesce('last_order_date', last_date_value),
+                                     last_date_value),
+        )
+        if not updated:
+            CustomerOrderSummary.objects.create(
+                customer=customer, order_count=count,
+                total_spent=spent, last_order_date=last_date,
+            )
+    return new_rows
+
+
+def iter_customer_summaries(archived=()):
+    """Recompute every customer summary from the order index plus the archived orders"""
+    extra = defaultdict(lambda: [0, 0.0, None])
+    for row in archived:
+        total = extra[row.customer]
+        total[0] += 1
+        if row.status != 'cancelled':
+            total[1] += row.price * row.quantity
+        total[2] = max(total[2], row.order_date) if total[2] else row.order_date
+
+    totals = (
+        OrderIndex.objects.values('customer')
+        .annotate(count=Count('id'),
+                  spent=Sum(F('price') * F('quantity'), filter=~Q(status='cancelled')),
+                  last_date=Max('order_date'))
+        .order_by()
+    )
+    for total in totals.iterator():
+        count, spent, last_date = extra.pop(total['customer'], (0, 0.0, None))
+        yield CustomerOrderSummary(
+            customer=total['customer'], order_count=total['count'] + count,
+            total_spent=(total['spent'] or 0) + spent,
+            last_order_date=max(filter(None, [total['last_date'], last_date])),
+        )
+    for customer, (count, spent, last_date) in extra.items():
+        yield CustomerOrderSummary(customer=customer, order_count=count,
+                                   total_spent=spent, last_order_date=last_date)
+
+
+def add_daily_sales(rows, sign=1):
+    """Add (or with sign=-1 remove) orders from the per product daily rollup"""
+    totals = defaultdict(lambda: [None, 0, 0, 0.0])
+    for row in rows:
+        total = totals[(row.product_id, timezone.localdate(row.order_date))]
+        total[0] = row.product_name
+        total[1] += sign
+        total[2] += sign * row.quantity
+        total[3] += sign * row.price * row.quantity
+
+    for (product_id, day), (name, count, units, revenue) in totals.items():
+        updated = ProductDailySales.objects.filter(product_id=product_id, day=day).update(
+            order_count=F('order_count') + count,
+            units=F('units') + units,
+            revenue=F('revenue') + revenue,
+        )
+        if not updated:
+            ProductDailySales.objects.create(
+                product_id=product_id, product_name=name, day=day,
+                order_count=count, units=units, revenue=revenue,
+            )
+
+
+def record_cancellations(rows):
+    """Take cancelled orders back out of the customer and daily sales rollups"""
+    refunds = defaultdict(float)
+    for row in rows:
+        refunds[row.customer] += row.price * row.quantity
+    for customer, amount in refunds.items():
+        CustomerOrderSummary.objects.filter(customer=customer).update(
+            total_spent=F('total_spent') - amount
+        )
+    add_daily_sales(rows, sign=-1)
+
+
+def record_deletions(rows):
+    """Take deleted orders out of the rollups altogether.
+
+    Cancelled orders already left the spend and daily sales totals, so
+    only their order count is taken back.
+    """
+    record_cancellations([row for row in rows if row.status != 'cancelled'])
+    counts = defaultdict(int)
+    for row in rows:
+        counts[row.customer] += 1
+    for customer, count in counts.items():
+        CustomerOrderSummary.objects.filter(customer=customer).update(
+            order_count=F('order_count') - count
+        )
+
+
+def iter_daily_sales(archived=()):
+    """Recompute the per product daily rollup from the order index plus the archived orders"""
+    extra = defaultdict(lambda: [None, 0, 0, 0.0])
+    for row in archived:
+        if row.status == 'cancelled':
+            continue
+        total = extra[(row.product_id, timezone.localdate(row.order_date))]
+        total[0] = row.product_name
+        total[1] += 1
+        total[2] += row.quantity
+        total[3] += row.price * row.quantity
+
+    totals = (
+        OrderIndex.objects.exclude(status='cancelled')
+        .annotate(day=TruncDate('order_date'))
+        .values('product_id', 'day')
+        .annotate(name=Max('product_name'), count=Count('id'),
+                  units=Sum('quantity'), revenue=Sum(F('price') * F('quantity')))
+        .order_by()
+    )
+    for total in totals.iterator():
+        name, count, units, revenue = extra.pop((total['product_id'], total['day']),
+                                                (None, 0, 0, 0.0))
+        yield ProductDailySales(
+            product_id=total['product_id'], product_name=total['name'] or name,
+            day=total['day'], order_count=total['count'] + count,
+            units=total['units'] + units, revenue=total['revenue'] + revenue,
+        )
+    for (product_id, day), (name, count, units, revenue) in extra.items():
+        yield ProductDailySales(product_id=product_id, product_name=name, day=day,
+                                order_count=count, units=units, revenue=revenue)
+
+
+def is_object_reference(predicate, obj):
+    """Object property triples between ontology individuals (not rdf:type)"""
+    return isinstance(obj, URIRef) and predicate.startswith(ECOM_NS) and obj.startswith(ECOM_NS)
+
+
+def add_references(triples):
+    """Record (subject, predicate, object) triples in the reverse index"""
+    ObjectReference.objects.bulk_create(
+        [ObjectReference(subject=str(s), predicate=str(p), object=str(o))
+         for s, p, o in triples if is_object_reference(p, o)],
+        ignore_conflicts=True,
+    )
+
+
+def remove_references(subjects, batch_size=500):
+    """Drop every reference made by the given subjects"""
+    subjects = [str(subject) for subject in subjects]
+    for start in range(0, len(subjects), batch_size):
+        ObjectReference.objects.filter(subject__in=subjects[start:start + batch_size]).delete()
+
+
+def referencing_subjects(obj, predicate=None):
+    """Subjects whose object properties point at obj, via the (object, predicate) index"""
+    references = ObjectReference.objects.filter(object=str(obj))
+    if predicate is not None:
+        references = references.filter(predicate=str(predicate))
+    return [URIRef(subject) for subject in references.values_list('subject', flat=True)]
+
+
+def iter_references(graph):
+    """Rebuild the reverse index rows from every object property triple in the graph"""
+    for s, p, o in graph:
+        if is_object_reference(p, o):
+            yield ObjectReference(subject=str(s), predicate=str(p), object=str(o))
+
+
+def add_product_ratings(feedbacks, sign=1):
+    """Add (or with sign=-1 remove) product reviews from the per product rating totals"""
+    totals = defaultdict(lambda: defaultdict(int))
+    for feedback in feedbacks:
+        if not feedback.product_id or not 1 <= feedback.rating <= 5:
+            continue
+        if feedback.moderation == Feedback.HIDDEN:
+            continue
+        total = totals[feedback.product_id]
+        total['rating_count'] += sign
+        total['rating_sum'] += sign * feedback.rating
+        total[f'stars_{feedback.rating}'] += sign
+
+    for product_id, changes in totals.items():
+        updated = ProductRating.objects.filter(product_id=product_id).update(
+            **{field: F(field) + change for field, change in changes.items()}
+        )
+        if not updated:
+            ProductRating.objects.create(product_id=product_id, **changes)
+
+
+def product_ratings(product_ids):
+    """ProductRating rows for product_ids, annotated with their Bayesian average.
+
+    The prior is the mean of every product rating, weighted by
+    PRODUCT_RATING_PRIOR_WEIGHT, so a product with a couple of five star
+    reviews does not outrank one with hundreds of four star reviews.
+    """
+    overall = ProductRating.objects.aggregate(count=Sum('rating_count'), total=Sum('rating_sum'))
+    prior_mean = overall['total'] / overall['count'] if overall['count'] else 3.0
+    ratings = ProductRating.objects.filter(product_id__in=product_ids, rating_count__gt=0)
+    ratings = {rating.product_id: rating for rating in ratings}
+    for rating in ratings.values():
+        rating.score = rating.bayesian_average(prior_mean, settings.PRODUCT_RATING_PRIOR_WEIGHT)
+    return ratings
+
+
+def iter_product_ratings():
+    """Recompute the per product rating totals from the Feedback table"""
+    rows = (Feedback.objects.exclude(product_id='').exclude(moderation=Feedback.HIDDEN)
+            .filter(rating__range=(1, 5))
+            .values('product_id', 'rating').annotate(n=Count('pk')))
+    totals = {}
+    for row in rows:
+        rating = totals.setdefault(row['product_id'], ProductRating(product_id=row['product_id']))
+        rating.rating_count += row['n']
+        rating.rating_sum += row['n'] * row['rating']
+        setattr(rating, f"stars_{row['rating']}", row['n'])
+    yield from totals.values()
+
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.archive import archive_orders
+
+
+class Command(BaseCommand):
+    help = "Move old delivered/cancelled orders from the ontology into the cold archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=settings.ORDER_ARCHIVE_AFTER_DAYS,
+                            help='Archive final orders placed more than this many days ago')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Orders moved per graph save and transaction')
+
+    def handle(self, *args, **options):
+        archived = archive_orders(options['older_than'], batch_size=options['batch_size'])
+        self.stdout.write(f"Archived {archived} orders")
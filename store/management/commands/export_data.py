@@ -0,0 +1,30 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from store.exports import (
+    EXPORT_FORMATS, FEEDBACK_FIELDS, ORDER_FIELDS, export_lines, iter_feedback, iter_orders
+)
+
+
+class Command(BaseCommand):
+    help = "Stream orders or feedback to a CSV / NDJSON file (or stdout)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=['orders', 'feedback'])
+        parser.add_argument('--format', choices=sorted(EXPORT_FORMATS), default='csv')
+        parser.add_argument('--output', help='File to write to (default: stdout)')
+
+    def handle(self, *args, **options):
+        if options['dataset'] == 'orders':
+            lines = export_lines(iter_orders(), ORDER_FIELDS, options['format'])
+        else:
+            lines = export_lines(iter_feedback(), FEEDBACK_FIELDS, options['format'])
+
+        out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for line in lines:
+                out.write(line)
+        finally:
+            if options['output']:
+                out.close()
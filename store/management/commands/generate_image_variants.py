@@ -0,0 +1,46 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from rdflib import Literal
+from rdflib.namespace import XSD
+
+from store.images import DEFAULT_IMAGE, generate_variants, image_placeholder, media_name
+from store.ontology import ECOM_NS, load_graph, locked_graph
+
+
+class Command(BaseCommand):
+    help = ("Render the resized variants and inline placeholders of every product image, "
+            "e.g. after changing IMAGE_VARIANTS")
+
+    def handle(self, *args, **options):
+        graph = load_graph()
+        images = {str(image) for image in graph.objects(None, ECOM_NS.hasImage)}
+        images.add(DEFAULT_IMAGE)
+        del graph
+
+        written, placeholders = 0, {}
+        for image in sorted(images):
+            written += len(generate_variants(image))
+            if image == DEFAULT_IMAGE:
+                continue
+            try:
+                placeholders[image] = image_placeholder(
+                    os.path.join(settings.MEDIA_ROOT, media_name(image))
+                )
+            except Exception as e:
+                print(f"Error computing placeholder of {image}: {str(e)}")
+        self.stdout.write(f"Wrote {written} variants of {len(images)} images")
+
+        # Match on the image under the lock: products may have changed since
+        updated = 0
+        with locked_graph() as graph:
+            for product, image in list(graph.subject_objects(ECOM_NS.hasImage)):
+                placeholder = placeholders.get(str(image))
+                if placeholder is None:
+                    continue
+                value = Literal(placeholder, datatype=XSD.string)
+                if graph.value(product, ECOM_NS.imagePlaceholder) != value:
+                    graph.set((product, ECOM_NS.imagePlaceholder, value))
+                    updated += 1
+        self.stdout.write(f"Set {updated} image placeholders")
@@ -0,0 +1,57 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from store.archive import iter_archived_orders
+from store.indexes import (
+    iter_customer_summaries, iter_daily_sales, iter_order_index_rows, iter_product_index_rows,
+    iter_product_ratings, iter_references
+)
+from store.models import (
+    CustomerOrderSummary, ObjectReference, OrderIndex, ProductDailySales, ProductIndex,
+    ProductRating
+)
+from store.ontology import load_graph
+from store.search import install_search_index
+
+
+class Command(BaseCommand):
+    help = "Rebuild the SQLite indexes derived from the ontology and the feedback table"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def bulk_insert(self, model, rows, batch_size):
+        batch, total = [], 0
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+                total += len(batch)
+                batch = []
+        model.objects.bulk_create(batch, ignore_conflicts=True)
+        return total + len(batch)
+
+    def handle(self, *args, **options):
+        graph = load_graph()
+        with transaction.atomic():
+            OrderIndex.objects.all().delete()
+            total = self.bulk_insert(OrderIndex, iter_order_index_rows(graph),
+                                     options['batch_size'])
+            # Archived orders left the graph and the order index but still
+            # count towards the rollups
+            CustomerOrderSummary.objects.all().delete()
+            customers = self.bulk_insert(CustomerOrderSummary,
+                                         iter_customer_summaries(iter_archived_orders()),
+                                         options['batch_size'])
+            ProductDailySales.objects.all().delete()
+            self.bulk_insert(ProductDailySales, iter_daily_sales(iter_archived_orders()),
+                             options['batch_size'])
+            ProductIndex.objects.all().delete()
+            self.bulk_insert(ProductIndex, iter_product_index_rows(graph), options['batch_size'])
+            ObjectReference.objects.all().delete()
+            self.bulk_insert(ObjectReference, iter_references(graph), options['batch_size'])
+            ProductRating.objects.all().delete()
+            self.bulk_insert(ProductRating, iter_product_ratings(), options['batch_size'])
+            with connection.cursor() as cursor:
+                install_search_index(cursor)
+        self.stdout.write(f"Indexed {total} orders for {customers} customers")
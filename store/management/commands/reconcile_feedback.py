@@ -0,0 +1,52 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from store.agents import FeedbackProjectionAgent
+from store.models import FeedbackOutbox
+from store.ontology import load_graph
+from store.reconcile import iter_graph_digests, iter_table_digests, merge_join
+
+
+class Command(BaseCommand):
+    help = "Find feedback whose ontology copy differs from the Feedback table and reproject it"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Repairs queued (and projected) per batch')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report the differences')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        graph = load_graph()
+        differences = merge_join(iter_table_digests(), iter_graph_digests(graph))
+        del graph
+
+        counts, batch = Counter(), []
+        for feedback_id, difference in differences:
+            counts[difference] += 1
+            if options['dry_run']:
+                continue
+            batch.append(FeedbackOutbox(feedback_id=feedback_id))
+            if len(batch) >= batch_size:
+                FeedbackOutbox.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            FeedbackOutbox.objects.bulk_create(batch)
+
+        summary = ", ".join(f"{count} {difference}" for difference, count in sorted(counts.items()))
+        self.stdout.write(f"Feedback differences: {summary or 'none'}")
+        if options['dry_run'] or not counts:
+            return
+
+        # The repairs are ordinary outbox entries: project them now rather
+        # than waiting for run_feedback_projector
+        agent = FeedbackProjectionAgent(batch_size=batch_size)
+        repaired = 0
+        while True:
+            claimed = agent.run_once()
+            if not claimed:
+                break
+            repaired += claimed
+        self.stdout.write(f"Projected {repaired} outbox entries")
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.agents import FeedbackProjectionAgent, run_agent_pool
+
+
+class Command(BaseCommand):
+    help = "Project the Feedback table into the ontology from the feedback outbox"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1,
+                            help='Number of worker threads')
+        parser.add_argument('--batch-size', type=int, default=settings.FEEDBACK_WORKER_BATCH_SIZE,
+                            help='Outbox entries applied per graph save')
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.FEEDBACK_WORKER_POLL_INTERVAL,
+                            help='Seconds to wait when the outbox is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the outbox and exit instead of polling forever')
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"Starting {options['workers']} feedback projection worker(s)")
+        run_agent_pool(
+            FeedbackProjectionAgent,
+            workers=options['workers'],
+            poll_interval=options['poll_interval'],
+            drain=options['once'],
+            batch_size=options['batch_size'],
+        )
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.agents import ImageProcessingAgent, run_agent_pool
+
+
+class Command(BaseCommand):
+    help = "Run the ImageProcessingAgent worker pool that publishes staged product image uploads"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.IMAGE_JOB_WORKER_COUNT,
+                            help='Number of worker threads')
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.IMAGE_JOB_POLL_INTERVAL,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit instead of polling forever')
+
+    def handle(self, *args, **options):
+        # Each worker requeues stale jobs and prunes finished ones on its
+        # first pass and every few minutes after that
+        self.stdout.write(f"Starting {options['workers']} image worker(s)")
+        run_agent_pool(
+            ImageProcessingAgent,
+            workers=options['workers'],
+            poll_interval=options['poll_interval'],
+            drain=options['once'],
+        )
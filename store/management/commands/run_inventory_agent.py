@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from store.agents import InventoryManagementAgent, run_agent_pool
+
+
+class Command(BaseCommand):
+    help = "Run the InventoryManagementAgent worker pool that applies queued orders to the ontology"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=settings.ORDER_WORKER_COUNT,
+                            help='Number of worker threads')
+        parser.add_argument('--batch-size', type=int, default=settings.ORDER_WORKER_BATCH_SIZE,
+                            help='Events applied per graph save')
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.ORDER_WORKER_POLL_INTERVAL,
+                            help='Seconds to wait when the queue is empty')
+        parser.add_argument('--once', action='store_true',
+                            help='Drain the queue and exit instead of polling forever')
+
+    def handle(self, *args, **options):
+        # Each worker requeues stale events and prunes expired idempotency
+        # keys on its first pass and every few minutes after that
+        self.stdout.write(f"Starting {options['workers']} inventory agent worker(s)")
+        run_agent_pool(
+            InventoryManagementAgent,
+            workers=options['workers'],
+            poll_interval=options['poll_interval'],
+            drain=options['once'],
+            batch_size=options['batch_size'],
+        )
@@ -0,0 +1,177 @@
+"""Serving uploaded media"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
+
+from .images import DEFAULT_IMAGE, IMAGE_DIR, is_immutable
+from .transforms import parse_transform, transformed_image
+
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class FileRange:
+    """Read only the length bytes of an open file starting at its current offset"""
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def close(self):
+        self.file.close()
+
+
+def media_etag(path, stat):
+    """Content addressed files are named after their hash; others use mtime and size"""
+    if is_immutable(path):
+        return quote_etag(posixpath.splitext(posixpath.basename(path))[0])
+    return quote_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+
+
+def byte_range(request, etag, size):
+    """(start, end) of a satisfiable single range request, None to send it all.
+
+    Raises ValueError for a range that lies beyond the end of the file.
+    Multiple ranges are answered with the whole file, which RFC 9110 allows.
+    """
+    header = request.META.get('HTTP_RANGE', '')
+    match = RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    # A range against a since-changed file would splice two versions together
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if if_range and if_range != etag:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        # Suffix range: the final `last` bytes
+        start, end = max(0, size - int(last)), size - 1
+    else:
+        start = int(first)
+        if last and int(last) < start:
+            return None
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size:
+        raise ValueError(header)
+    return start, end
+
+
+def send_file(request, full_path, etag, cache_control, accel_path=None):
+    """Answer request with the file at full_path, honouring conditional and range headers.
+
+    With MEDIA_SENDFILE set, the front-end server (nginx, Apache) sends the
+    bytes and handles ranges itself; X-Accel-Redirect needs accel_path, the
+    internal location of the file. Otherwise the file is streamed by
+    FileResponse, which WSGI servers hand to sendfile() when they can.
+    """
+    stat = os.stat(full_path)
+    validators = {
+        'ETag': etag,
+        'Last-Modified': http_date(stat.st_mtime),
+        'Cache-Control': cache_control,
+    }
+    conditional = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if conditional is not None:
+        for header, value in validators.items():
+            conditional[header] = value
+        return conditional
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+
+    if settings.MEDIA_SENDFILE == 'x-accel-redirect' and accel_path:
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = quote(accel_path)
+    elif settings.MEDIA_SENDFILE == 'x-sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = full_path
+    else:
+        try:
+            requested = byte_range(request, etag, stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{stat.st_size}'
+            return response
+        file = open(full_path, 'rb')
+        if requested is None:
+            response = FileResponse(file, content_type=content_type)
+        else:
+            start, end = requested
+            file.seek(start)
+            response = FileResponse(FileRange(file, end - start + 1),
+                                    content_type=content_type, status=206)
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = end - start + 1
+        response['Accept-Ranges'] = 'bytes'
+
+    for header, value in validators.items():
+        response[header] = value
+    return response
+
+
+def media_file(path):
+    """Absolute path of the file path names under MEDIA_ROOT, or Http404"""
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404("Media not found")
+    if not os.path.isfile(full_path):
+        raise Http404("Media not found")
+    return full_path
+
+
+def cache_control(path):
+    if is_immutable(path):
+        return f'public, max-age={settings.IMAGE_CACHE_MAX_AGE}, immutable'
+    return 'public, no-cache'
+
+
+@require_safe
+def serve_media(request, path):
+    """Serve a file from MEDIA_ROOT with validators, ranges and sendfile offload"""
+    full_path = media_file(path)
+    etag = media_etag(path, os.stat(full_path))
+    return send_file(request, full_path, etag, cache_control(path),
+                     accel_path=settings.MEDIA_ACCEL_PREFIX + path)
+
+
+@require_safe
+def transform_image(request, path):
+    """A product image resized to ?w=&h= and encoded as ?fmt= at quality ?q=.
+
+    Renderings are cached on disk, so only the first request for a given
+    image and parameters pays for the resize.
+    """
+    if not (path.startswith(IMAGE_DIR + '/') or path == DEFAULT_IMAGE):
+        raise Http404("Media not found")
+    full_path = media_file(path)
+    try:
+        width, height, fmt, quality = parse_transform(request.GET)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    try:
+        cached_path, key = transformed_image(
+            full_path, os.stat(full_path), width, height, fmt, quality
+        )
+    except Exception as e:
+        print(f"Error transforming {path}: {str(e)}")
+        return HttpResponseBadRequest("Not a readable image")
+    # The key covers the source file's mtime, so a content addressed source
+    # is the only case where the URL can never show different bytes
+    return send_file(request, cached_path, quote_etag(key), cache_control(path))
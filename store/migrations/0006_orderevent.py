@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_alter_feedback_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.CharField(max_length=64, unique=True)),
+                ('customer', models.CharField(max_length=200)),
+                ('product_id', models.CharField(max_length=200)),
+                ('quantity', models.IntegerField()),
+                ('price', models.FloatField()),
+                ('order_date', models.DateTimeField()),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('processing', 'Processing'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=20)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='store_order_status_3fd25c_idx'), models.Index(fields=['status', 'product_id'], name='store_order_status_4af8de_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_orderevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order_id', models.CharField(max_length=64, unique=True)),
+                ('customer', models.CharField(max_length=200)),
+                ('product_id', models.CharField(max_length=200)),
+                ('product_name', models.CharField(max_length=200)),
+                ('quantity', models.IntegerField()),
+                ('price', models.FloatField()),
+                ('status', models.CharField(default='pending', max_length=50)),
+                ('order_date', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'order_date'], name='store_order_status_3ef946_idx'), models.Index(fields=['customer', 'order_date'], name='store_order_custome_e080b7_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_orderindex'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerOrderSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('customer', models.CharField(max_length=200, unique=True)),
+                ('order_count', models.IntegerField(default=0)),
+                ('total_spent', models.FloatField(default=0)),
+                ('last_order_date', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
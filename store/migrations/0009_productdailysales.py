@@ -0,0 +1,33 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_customerordersummary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.CharField(max_length=200)),
+                ('product_name', models.CharField(max_length=200)),
+                ('day', models.DateField(db_index=True)),
+                ('order_count', models.IntegerField(default=0)),
+                ('units', models.IntegerField(default=0)),
+                ('revenue', models.FloatField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='customerordersummary',
+            index=models.Index(fields=['-total_spent'], name='store_custo_total_s_9e4b5b_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='productdailysales',
+            constraint=models.UniqueConstraint(fields=('product_id', 'day'), name='unique_product_day_sales'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Feedback rows created before 0005_alter_feedback_id kept their integer
+# primary keys, which the UUIDField cannot load. Give them stable UUIDs.
+
+import uuid
+from django.db import migrations
+
+
+def convert_legacy_ids(apps, schema_editor):
+    Feedback = apps.get_model('store', 'Feedback')
+    table = schema_editor.quote_name(Feedback._meta.db_table)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(f"SELECT id FROM {table}")
+        legacy_ids = [row[0] for row in cursor.fetchall() if str(row[0]).isdigit()]
+        for legacy_id in legacy_ids:
+            cursor.execute(
+                f"UPDATE {table} SET id = %s WHERE id = %s",
+                [uuid.UUID(int=int(legacy_id)).hex, legacy_id],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_productdailysales'),
+    ]
+
+    operations = [
+        migrations.RunPython(convert_legacy_ids, migrations.RunPython.noop),
+    ]
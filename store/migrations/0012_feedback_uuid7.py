@@ -0,0 +1,19 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:15
+
+import store.identifiers
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='feedback',
+            name='id',
+            field=models.UUIDField(default=store.identifiers.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0012_feedback_uuid7'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObjectReference',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('subject', models.CharField(max_length=255)),
+                ('predicate', models.CharField(max_length=255)),
+                ('object', models.CharField(max_length=255)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['object', 'predicate'], name='store_objec_object_35ed96_idx'), models.Index(fields=['subject'], name='store_objec_subject_648fcd_idx')],
+                'constraints': [models.UniqueConstraint(fields=('subject', 'predicate', 'object'), name='unique_object_reference')],
+            },
+        ),
+    ]
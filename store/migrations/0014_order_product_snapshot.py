@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0013_objectreference'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderevent',
+            name='discount',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='orderevent',
+            name='product_name',
+            field=models.CharField(blank=True, max_length=200),
+        ),
+        migrations.AddField(
+            model_name='orderevent',
+            name='unit_price',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='orderindex',
+            name='discount',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='orderindex',
+            name='unit_price',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,90 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:20
+
+import os
+import uuid
+
+from django.db import migrations, models
+from django.utils import timezone
+from rdflib import Graph, Namespace
+from rdflib.namespace import RDF
+
+# Frozen copies of store.ontology so later changes to the app cannot alter
+# what this migration does
+ECOM_NS = Namespace("http://www.example.org/ecommerce_ontology#")
+ONTOLOGY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'ontology', 'Ecommerce_Platform.xml',
+)
+
+
+def load_graph():
+    graph = Graph()
+    try:
+        graph.parse(ONTOLOGY_PATH, format='xml')
+    except Exception as e:
+        print(f"Error loading ontology: {e}")
+    return graph
+
+
+def adopt_graph_feedback(apps, schema_editor):
+    """Make the table the system of record and queue every row for projection"""
+    Feedback = apps.get_model('store', 'Feedback')
+    FeedbackOutbox = apps.get_model('store', 'FeedbackOutbox')
+    graph = load_graph()
+    for feedback_uri in graph.subjects(RDF.type, ECOM_NS.Feedback):
+        try:
+            feedback_id = uuid.UUID(str(feedback_uri).split('#')[-1])
+        except ValueError:
+            continue
+        email = str(graph.value(feedback_uri, ECOM_NS.userEmail) or "")
+        if Feedback.objects.filter(id=feedback_id).update(email=email):
+            continue
+        # Only ever written to the ontology; copy it into the table
+        Feedback.objects.create(
+            id=feedback_id,
+            user=str(graph.value(feedback_uri, ECOM_NS.feedbackUser) or ""),
+            email=email,
+            rating=int(graph.value(feedback_uri, ECOM_NS.rating) or 0),
+            comment=str(graph.value(feedback_uri, ECOM_NS.comment) or ""),
+        )
+        submitted = graph.value(feedback_uri, ECOM_NS.submissionDate)
+        if submitted is not None:
+            submitted = submitted.toPython()
+            if timezone.is_naive(submitted):
+                submitted = timezone.make_aware(submitted)
+            Feedback.objects.filter(id=feedback_id).update(created_at=submitted)
+
+    FeedbackOutbox.objects.bulk_create(
+        FeedbackOutbox(feedback_id=feedback_id)
+        for feedback_id in Feedback.objects.order_by('created_at').values_list('id', flat=True)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_order_product_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedback',
+            name='email',
+            field=models.CharField(blank=True, max_length=254),
+        ),
+        migrations.CreateModel(
+            name='FeedbackOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('feedback_id', models.UUIDField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['claimed_at', 'id'], name='store_feedb_claimed_fcbaeb_idx')],
+            },
+        ),
+        migrations.RunPython(adopt_graph_feedback, migrations.RunPython.noop),
+    ]
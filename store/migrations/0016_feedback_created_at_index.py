@@ -0,0 +1,17 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_feedback_outbox'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feedback',
+            index=models.Index(fields=['-created_at', '-id'], name='store_feedb_created_be3dee_idx'),
+        ),
+    ]
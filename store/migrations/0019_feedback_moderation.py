@@ -0,0 +1,18 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0018_product_rating'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='feedback',
+            name='moderation',
+            field=models.CharField(choices=[('pending', 'Pending'), ('approved', 'Approved'), ('hidden', 'Hidden')], db_index=True, default='pending', max_length=10),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:27
+
+from django.db import migrations
+
+# Frozen copy of the statements in store.search at the time of writing
+SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS store_feedback_fts USING fts5(
+        user, comment, content='store_feedback', content_rowid='rowid',
+        tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS store_feedback_fts_insert AFTER INSERT ON store_feedback BEGIN
+        INSERT INTO store_feedback_fts(rowid, user, comment)
+        VALUES (new.rowid, new.user, new.comment);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_feedback_fts_delete AFTER DELETE ON store_feedback BEGIN
+        INSERT INTO store_feedback_fts(store_feedback_fts, rowid, user, comment)
+        VALUES ('delete', old.rowid, old.user, old.comment);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_feedback_fts_update
+    AFTER UPDATE OF user, comment ON store_feedback BEGIN
+        INSERT INTO store_feedback_fts(store_feedback_fts, rowid, user, comment)
+        VALUES ('delete', old.rowid, old.user, old.comment);
+        INSERT INTO store_feedback_fts(rowid, user, comment)
+        VALUES (new.rowid, new.user, new.comment);
+    END""",
+]
+DROP = [
+    "DROP TRIGGER IF EXISTS store_feedback_fts_update",
+    "DROP TRIGGER IF EXISTS store_feedback_fts_delete",
+    "DROP TRIGGER IF EXISTS store_feedback_fts_insert",
+    "DROP TABLE IF EXISTS store_feedback_fts",
+]
+REBUILD = "INSERT INTO store_feedback_fts(store_feedback_fts) VALUES ('rebuild')"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0019_feedback_moderation'),
+    ]
+
+    operations = [
+        migrations.RunSQL(SCHEMA + [REBUILD], reverse_sql=DROP),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:52
+
+import os
+
+from django.db import migrations, models
+from rdflib import Graph, Literal, Namespace
+from rdflib.namespace import RDF
+
+# Snapshot of store.ontology, as in 0015
+ECOM_NS = Namespace("http://www.example.org/ecommerce_ontology#")
+ONTOLOGY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'ontology', 'Ecommerce_Platform.xml',
+)
+
+
+def load_graph():
+    graph = Graph()
+    try:
+        graph.parse(ONTOLOGY_PATH, format='xml')
+    except Exception as e:
+        print(f"Error loading ontology: {e}")
+    return graph
+
+
+def index_graph_products(apps, schema_editor):
+    """Orders are placed against the index, so fill it before the app serves them"""
+    ProductIndex = apps.get_model('store', 'ProductIndex')
+    graph = load_graph()
+    rows = []
+    for product in graph.subjects(RDF.type, ECOM_NS.Product):
+        try:
+            rows.append(ProductIndex(
+                product_id=str(product).split('#')[-1],
+                name=str(graph.value(product, ECOM_NS.name) or ""),
+                price=float(graph.value(product, ECOM_NS.price) or 0),
+                discount=float(graph.value(product, ECOM_NS.discount) or 0),
+                stock_level=int(graph.value(product, ECOM_NS.stockLevel) or 0),
+                deleted=(product, ECOM_NS.deleted, Literal(True)) in graph,
+            ))
+        except Exception as e:
+            print(f"Error processing product {product}: {str(e)}")
+    ProductIndex.objects.bulk_create(rows, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0021_image_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductIndex',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('product_id', models.CharField(max_length=200, unique=True)),
+                ('name', models.CharField(db_index=True, max_length=200)),
+                ('price', models.FloatField()),
+                ('discount', models.FloatField(default=0)),
+                ('stock_level', models.IntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+            ],
+        ),
+        migrations.RunPython(index_graph_products, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0022_product_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeedbackAnalysisState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('analyzed_through', models.DateTimeField(blank=True, null=True)),
+                ('analyzed_through_id', models.UUIDField(blank=True, null=True)),
+                ('insights', models.JSONField(default=dict)),
+                ('insights_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.1.4 on 2026-10-19 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0023_feedback_analysis_state'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='orderindex',
+            name='store_order_status_3ef946_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='orderindex',
+            name='store_order_custome_e080b7_idx',
+        ),
+        migrations.AlterField(
+            model_name='orderindex',
+            name='order_date',
+            field=models.DateTimeField(),
+        ),
+        migrations.AddIndex(
+            model_name='orderindex',
+            index=models.Index(fields=['order_date', 'order_id'], name='store_order_order_d_160a15_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderindex',
+            index=models.Index(fields=['status', 'order_date', 'order_id'], name='store_order_status_f8a58f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='orderindex',
+            index=models.Index(fields=['customer', 'order_date', 'order_id'], name='store_order_custome_9ec23d_idx'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.1.4 on 2026-10-19 15:02
+
+import os
+
+from django.db import migrations
+from rdflib import Graph, Namespace, URIRef
+
+# Snapshot of store.ontology, as in 0015
+ECOM_NS = Namespace("http://www.example.org/ecommerce_ontology#")
+ONTOLOGY_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+    'ontology', 'Ecommerce_Platform.xml',
+)
+
+
+def index_graph_references(apps, schema_editor):
+    """0013 created the reverse index empty; fill it so deletes see existing references"""
+    ObjectReference = apps.get_model('store', 'ObjectReference')
+    graph = Graph()
+    try:
+        graph.parse(ONTOLOGY_PATH, format='xml')
+    except Exception as e:
+        print(f"Error loading ontology: {e}")
+        return
+    ObjectReference.objects.bulk_create(
+        (ObjectReference(subject=str(s), predicate=str(p), object=str(o))
+         for s, p, o in graph
+         if isinstance(o, URIRef) and p.startswith(ECOM_NS) and o.startswith(ECOM_NS)),
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0024_order_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(index_graph_references, migrations.RunPython.noop),
+    ]
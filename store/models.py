@@ -1,5 +1,6 @@
 from django.db import models
-import uuid
+
+from .identifiers import uuid7
 
 class Product(models.Model):
     name = models.CharField(max_length=200)
@@ -31,11 +32,338 @@ class Feedback(models.Model):
         return f"Feedback from {self.user} - Rating: {self.rating}"
 
 class Feedback(models.Model):
-    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    """System of record for feedback; the ontology copy is projected from FeedbackOutbox"""
+    PENDING = 'pending'
+    APPROVED = 'approved'
+    HIDDEN = 'hidden'
+    MODERATION_CHOICES = [
+        (PENDING, 'Pending'),
+        (APPROVED, 'Approved'),
+        (HIDDEN, 'Hidden'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
     user = models.CharField(max_length=100)
+    email = models.CharField(max_length=254, blank=True)
+    # Ontology id of the product being reviewed, empty for general feedback
+    product_id = models.CharField(max_length=200, blank=True, db_index=True)
     rating = models.IntegerField()
     comment = models.TextField()
+    # Hidden feedback is kept but left out of product ratings
+    moderation = models.CharField(max_length=10, choices=MODERATION_CHOICES, default=PENDING,
+                                  db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['-created_at', '-id'])]
+
     def __str__(self):
         return f"Feedback from {self.user}"
+
+
+class FeedbackAnalysis(models.Model):
+    """Sentiment of one feedback comment, written by the FeedbackManagementAgent"""
+    POSITIVE = 'positive'
+    NEUTRAL = 'neutral'
+    NEGATIVE = 'negative'
+    LABEL_CHOICES = [
+        (POSITIVE, 'Positive'),
+        (NEUTRAL, 'Neutral'),
+        (NEGATIVE, 'Negative'),
+    ]
+
+    feedback = models.OneToOneField(Feedback, on_delete=models.CASCADE, primary_key=True,
+                                    related_name='analysis')
+    sentiment = models.FloatField()
+    label = models.CharField(max_length=10, choices=LABEL_CHOICES, db_index=True)
+    analyzed_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.feedback_id}: {self.label} ({self.sentiment:.2f})"
+
+
+class FeedbackKeyword(models.Model):
+    """Keyword extracted from a feedback comment"""
+    feedback = models.ForeignKey(Feedback, on_delete=models.CASCADE, related_name='keywords')
+    term = models.CharField(max_length=100, db_index=True)
+
+    def __str__(self):
+        return self.term
+
+
+class FeedbackAnalysisState(models.Model):
+    """Single row recording how far the FeedbackManagementAgent has got.
+
+    analyzed_through and analyzed_through_id are the (created_at, id) of the
+    last feedback analyzed; insights is the feedback_insights() snapshot
+    taken at the end of the last analyze_feedback run.
+    """
+    analyzed_through = models.DateTimeField(null=True, blank=True)
+    analyzed_through_id = models.UUIDField(null=True, blank=True)
+    insights = models.JSONField(default=dict)
+    insights_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Feedback analyzed through {self.analyzed_through}"
+
+
+class FeedbackOutbox(models.Model):
+    """Feedback changed in the same transaction, waiting to be projected into the ontology.
+
+    Entries only name the feedback; the FeedbackProjectionAgent copies
+    whatever the table holds when it runs, so replays and reordering are
+    harmless.
+    """
+    feedback_id = models.UUIDField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['claimed_at', 'id'])]
+
+    def __str__(self):
+        return f"Outbox {self.id} for feedback {self.feedback_id}"
+
+
+class OrderEvent(models.Model):
+    """Durable queue entry for an order waiting on the InventoryManagementAgent"""
+    QUEUED = 'queued'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    # Events in these states still hold their quantity against product stock
+    RESERVING = (QUEUED, PROCESSING)
+
+    order_id = models.CharField(max_length=64, unique=True)
+    customer = models.CharField(max_length=200)
+    product_id = models.CharField(max_length=200)
+    # Product as it was when the order was placed
+    product_name = models.CharField(max_length=200, blank=True)
+    unit_price = models.FloatField(null=True, blank=True)
+    discount = models.FloatField(default=0)
+    quantity = models.IntegerField()
+    price = models.FloatField()
+    order_date = models.DateTimeField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id']),
+            models.Index(fields=['status', 'product_id']),
+        ]
+
+    @classmethod
+    def reserved_quantities(cls, product_ids=None):
+        """Map product id to the quantity held by orders not yet applied to the graph"""
+        events = cls.objects.filter(status__in=cls.RESERVING)
+        if product_ids is not None:
+            events = events.filter(product_id__in=product_ids)
+        return dict(
+            events.values_list('product_id').annotate(total=models.Sum('quantity'))
+        )
+
+    def __str__(self):
+        return f"Order event {self.order_id} ({self.status})"
+
+
+class OrderIndex(models.Model):
+    """Queryable projection of Order individuals for listings and filters"""
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('paid', 'Paid'),
+        ('shipped', 'Shipped'),
+        ('delivered', 'Delivered'),
+        ('cancelled', 'Cancelled'),
+    ]
+    # Allowed order status transitions; delivered and cancelled are final
+    TRANSITIONS = {
+        'pending': {'paid', 'cancelled'},
+        'paid': {'shipped', 'cancelled'},
+        'shipped': {'delivered'},
+        'delivered': set(),
+        'cancelled': set(),
+    }
+
+    order_id = models.CharField(max_length=64, unique=True)
+    customer = models.CharField(max_length=200)
+    product_id = models.CharField(max_length=200)
+    # Snapshot of the product at purchase time; price is the discounted unit price
+    product_name = models.CharField(max_length=200)
+    unit_price = models.FloatField(null=True, blank=True)
+    discount = models.FloatField(default=0)
+    quantity = models.IntegerField()
+    price = models.FloatField()
+    status = models.CharField(max_length=50, default='pending')
+    order_date = models.DateTimeField()
+
+    class Meta:
+        # Listings are keyset paged by (order_date, order_id), unfiltered or
+        # under a status or customer filter
+        indexes = [
+            models.Index(fields=['order_date', 'order_id']),
+            models.Index(fields=['status', 'order_date', 'order_id']),
+            models.Index(fields=['customer', 'order_date', 'order_id']),
+        ]
+
+    def __str__(self):
+        return f"Order {self.order_id} for {self.customer}"
+
+
+class ProductIndex(models.Model):
+    """Queryable projection of Product individuals for order placement.
+
+    stock_level moves in the same transactions that mark order events done
+    or cancel orders, so stock minus OrderEvent reservations read together
+    inside one transaction is never counted twice or missed.
+    """
+    product_id = models.CharField(max_length=200, unique=True)
+    name = models.CharField(max_length=200, db_index=True)
+    price = models.FloatField()
+    discount = models.FloatField(default=0)
+    stock_level = models.IntegerField()
+    # Tombstoned products stay indexed so their orders resolve
+    deleted = models.BooleanField(default=False)
+
+    def __str__(self):
+        return f"{self.name}: {self.stock_level} in stock"
+
+
+class CustomerOrderSummary(models.Model):
+    """Running order totals per customer, updated as orders are indexed"""
+    customer = models.CharField(max_length=200, unique=True)
+    order_count = models.IntegerField(default=0)
+    total_spent = models.FloatField(default=0)
+    last_order_date = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-total_spent']),
+        ]
+
+    def __str__(self):
+        return f"{self.customer}: {self.order_count} orders"
+
+
+class ProductDailySales(models.Model):
+    """Revenue and units sold per product per day, rolled up as orders arrive"""
+    product_id = models.CharField(max_length=200)
+    product_name = models.CharField(max_length=200)
+    day = models.DateField(db_index=True)
+    order_count = models.IntegerField(default=0)
+    units = models.IntegerField(default=0)
+    revenue = models.FloatField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['product_id', 'day'], name='unique_product_day_sales'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_name} on {self.day}: {self.units} units"
+
+
+class IdempotencyKey(models.Model):
+    """Client supplied key remembered so retried order submissions are not replayed"""
+    key = models.CharField(max_length=255, unique=True)
+    order_id = models.CharField(max_length=64)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.key} -> {self.order_id}"
+
+
+class ObjectReference(models.Model):
+    """Reverse index of object property triples: which subjects point at an object"""
+    subject = models.CharField(max_length=255)
+    predicate = models.CharField(max_length=255)
+    object = models.CharField(max_length=255)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['object', 'predicate']),
+            models.Index(fields=['subject']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['subject', 'predicate', 'object'],
+                                    name='unique_object_reference'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} {self.predicate} {self.object}"
+
+
+class ProductRating(models.Model):
+    """Running rating totals per product, adjusted as reviews are added or removed"""
+    product_id = models.CharField(max_length=200, unique=True)
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    stars_1 = models.IntegerField(default=0)
+    stars_2 = models.IntegerField(default=0)
+    stars_3 = models.IntegerField(default=0)
+    stars_4 = models.IntegerField(default=0)
+    stars_5 = models.IntegerField(default=0)
+
+    @property
+    def average(self):
+        return self.rating_sum / self.rating_count if self.rating_count else None
+
+    @property
+    def histogram(self):
+        """(stars, count) pairs from 5 stars down to 1"""
+        return [(stars, getattr(self, f'stars_{stars}')) for stars in range(5, 0, -1)]
+
+    def bayesian_average(self, prior_mean, prior_weight):
+        """Average pulled towards prior_mean, as if prior_weight such ratings were added"""
+        return (prior_mean * prior_weight + self.rating_sum) / (prior_weight + self.rating_count)
+
+    def __str__(self):
+        return f"{self.product_id}: {self.rating_count} ratings"
+
+
+
+class ImageJob(models.Model):
+    """An uploaded product image waiting in the staging area for the ImageProcessingAgent.
+
+    Finished jobs are kept for a while so a slow older upload can tell that
+    a newer one for the same product has already been published.
+    """
+    QUEUED = 'queued'
+    PROCESSING = 'processing'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (PROCESSING, 'Processing'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    product_id = models.CharField(max_length=200, db_index=True)
+    staged_name = models.CharField(max_length=255)
+    original_name = models.CharField(max_length=255, blank=True)
+    # The published hasImage value once the job is done
+    image = models.CharField(max_length=255, blank=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'id'])]
+
+    def __str__(self):
+        return f"{self.product_id}: {self.original_name} ({self.status})"
@@ -0,0 +1,98 @@
+"""Shared access to the e-commerce ontology graph"""
+import os
+from contextlib import contextmanager
+
+from rdflib import Graph, Namespace
+
+ECOM_NS = Namespace("http://www.example.org/ecommerce_ontology#")
+
+ONTOLOGY_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                             'ontology', 'Ecommerce_Platform.xml')
+LOCK_PATH = ONTOLOGY_PATH + '.lock'
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive lock on path across threads and processes"""
+    with open(path, 'a+b') as lock_file:
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def graph_lock():
+    """Serialize writers of the ontology file across threads and processes"""
+    return file_lock(LOCK_PATH)
+
+
+def read_source(path=ONTOLOGY_PATH):
+    """Return the raw ontology document and its modification stamp"""
+    with open(path, 'rb') as f:
+        return f.read(), os.fstat(f.fileno()).st_mtime_ns
+
+
+def parse_source(source):
+    graph = Graph()
+    graph.parse(data=source, format='xml')
+    return graph
+
+
+def load_graph(path=ONTOLOGY_PATH):
+    """Load the ontology, returning an empty graph if it cannot be read"""
+    try:
+        source, _ = read_source(path)
+        return parse_source(source)
+    except Exception as e:
+        print(f"Error loading ontology: {e}")
+        return Graph()
+
+
+def write_graph(graph, path=ONTOLOGY_PATH):
+    """Atomically replace the ontology file. Callers must hold graph_lock()."""
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    graph.serialize(destination=tmp_path, format="xml")
+    os.replace(tmp_path, path)
+
+
+def merge_changes(base, graph, current):
+    """Apply the changes made between base and graph onto current.
+
+    Values the caller replaced win over concurrent edits of the same
+    subject/predicate pair, so functional properties keep a single value.
+    """
+    removed = base - graph
+    added = graph - base
+    replaced = {(s, p) for s, p, _ in removed}
+    for triple in removed:
+        current.remove(triple)
+    for s, p, o in added:
+        if (s, p) in replaced:
+            current.remove((s, p, None))
+            replaced.discard((s, p))
+        current.add((s, p, o))
+    return current
+
+
+@contextmanager
+def locked_graph(path=ONTOLOGY_PATH):
+    """Load a fresh graph under the writer lock and persist it on exit"""
+    with graph_lock():
+        graph = load_graph(path)
+        yield graph
+        write_graph(graph, path)
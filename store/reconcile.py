@@ -0,0 +1,58 @@
+"""Compare the Feedback table with its projection in the ontology"""
+import hashlib
+import uuid
+
+from rdflib.namespace import RDF
+
+from .agents import FeedbackProjectionAgent
+from .models import Feedback
+from .ontology import ECOM_NS
+
+MISSING = 'missing'    # row with no individual in the graph
+ORPHANED = 'orphaned'  # individual whose row no longer exists
+CHANGED = 'changed'    # both exist but the content differs
+
+
+def triples_digest(pairs):
+    """Order independent hash of (predicate, object) pairs"""
+    lines = sorted(f"{predicate.n3()} {obj.n3()}" for predicate, obj in pairs)
+    return hashlib.sha1("\n".join(lines).encode()).hexdigest()
+
+
+def iter_table_digests(chunk_size=2000):
+    """(id, digest) of what every Feedback row should look like in the graph, by id"""
+    for feedback in Feedback.objects.order_by('id').iterator(chunk_size=chunk_size):
+        yield feedback.id, triples_digest(FeedbackProjectionAgent.feedback_triples(feedback))
+
+
+def iter_graph_digests(graph):
+    """(id, digest) of every Feedback individual in the graph, by id"""
+    digests = []
+    for subject in graph.subjects(RDF.type, ECOM_NS.Feedback):
+        try:
+            feedback_id = uuid.UUID(str(subject).split('#')[-1])
+        except ValueError:
+            print(f"Skipping feedback individual with a non UUID name: {subject}")
+            continue
+        digests.append((feedback_id, triples_digest(graph.predicate_objects(subject))))
+    digests.sort()
+    return iter(digests)
+
+
+def merge_join(table, graph):
+    """Walk both id ordered streams together, yielding (id, difference) for mismatches"""
+    sentinel = (None, None)
+    table_id, table_digest = next(table, sentinel)
+    graph_id, graph_digest = next(graph, sentinel)
+    while table_id is not None or graph_id is not None:
+        if graph_id is None or (table_id is not None and table_id < graph_id):
+            yield table_id, MISSING
+            table_id, table_digest = next(table, sentinel)
+        elif table_id is None or graph_id < table_id:
+            yield graph_id, ORPHANED
+            graph_id, graph_digest = next(graph, sentinel)
+        else:
+            if table_digest != graph_digest:
+                yield table_id, CHANGED
+            table_id, table_digest = next(table, sentinel)
+            graph_id, graph_digest = next(graph, sentinel)
@@ -0,0 +1,128 @@
+"""SQLite FTS5 full-text index over feedback comments"""
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+# External content index: the text lives only in store_feedback and the
+# triggers keep the index in step with every insert, update and delete.
+# SQLite drops triggers when Django rebuilds the table during a migration,
+# so rebuild_indexes reinstalls them with install_search_index().
+SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS store_feedback_fts USING fts5(
+        user, comment, content='store_feedback', content_rowid='rowid',
+        tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS store_feedback_fts_insert AFTER INSERT ON store_feedback BEGIN
+        INSERT INTO store_feedback_fts(rowid, user, comment)
+        VALUES (new.rowid, new.user, new.comment);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_feedback_fts_delete AFTER DELETE ON store_feedback BEGIN
+        INSERT INTO store_feedback_fts(store_feedback_fts, rowid, user, comment)
+        VALUES ('delete', old.rowid, old.user, old.comment);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS store_feedback_fts_update
+    AFTER UPDATE OF user, comment ON store_feedback BEGIN
+        INSERT INTO store_feedback_fts(store_feedback_fts, rowid, user, comment)
+        VALUES ('delete', old.rowid, old.user, old.comment);
+        INSERT INTO store_feedback_fts(rowid, user, comment)
+        VALUES (new.rowid, new.user, new.comment);
+    END""",
+]
+DROP = [
+    "DROP TRIGGER IF EXISTS store_feedback_fts_update",
+    "DROP TRIGGER IF EXISTS store_feedback_fts_delete",
+    "DROP TRIGGER IF EXISTS store_feedback_fts_insert",
+    "DROP TABLE IF EXISTS store_feedback_fts",
+]
+REBUILD = "INSERT INTO store_feedback_fts(store_feedback_fts) VALUES ('rebuild')"
+
+# Column weights for bm25(): a match in the comment counts more than the name
+USER_WEIGHT, COMMENT_WEIGHT = 0.5, 1.0
+MARK_START, MARK_END = '\x02', '\x03'
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def install_search_index(cursor):
+    """(Re)create the index and its triggers, then reindex every feedback row"""
+    for statement in SCHEMA:
+        cursor.execute(statement)
+    cursor.execute(REBUILD)
+
+
+def match_query(text):
+    """Turn free text into an FTS5 query that ANDs its words, the last one as a prefix"""
+    terms = TERM_RE.findall(text or "")
+    if not terms:
+        return None
+    quoted = [f'"{term}"' for term in terms]
+    quoted[-1] += '*'
+    return " ".join(quoted)
+
+
+def highlight(snippet):
+    """Escape a snippet and turn the FTS5 match markers into <mark> tags"""
+    return mark_safe(
+        escape(snippet).replace(MARK_START, '<mark>').replace(MARK_END, '</mark>')
+    )
+
+
+def search_scope(queryset):
+    """SQL narrowing a match to the feedback in queryset, '' when it holds every row"""
+    if not queryset.query.where:
+        return "", []
+    sql, params = queryset.values('id').query.sql_with_params()
+    return f"AND f.id IN ({sql})", list(params)
+
+
+def search_feedback_ids(queryset, text):
+    """Ids of every feedback in queryset matching text, for bulk actions on a search"""
+    query = match_query(text)
+    if not query:
+        return []
+    scope_sql, scope_params = search_scope(queryset)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""SELECT f.id
+                FROM store_feedback_fts JOIN store_feedback f ON f.rowid = store_feedback_fts.rowid
+                WHERE store_feedback_fts MATCH %s {scope_sql}""",
+            [query, *scope_params],
+        )
+        to_python = queryset.model._meta.pk.to_python
+        return [to_python(feedback_id) for feedback_id, in cursor.fetchall()]
+
+
+def search_feedback(queryset, text, page=1, page_size=10):
+    """Best matching feedback in queryset for text, ranked by bm25.
+
+    Returns (feedbacks, has_next) for the requested page. Each feedback
+    carries a `snippet` of its comment with the matches highlighted.
+    """
+    query = match_query(text)
+    if not query:
+        return [], False
+    scope_sql, scope_params = search_scope(queryset)
+    offset = (page - 1) * page_size
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"""SELECT f.id, snippet(store_feedback_fts, 1, %s, %s, '...', 24)
+                FROM store_feedback_fts JOIN store_feedback f ON f.rowid = store_feedback_fts.rowid
+                WHERE store_feedback_fts MATCH %s {scope_sql}
+                ORDER BY bm25(store_feedback_fts, %s, %s)
+                LIMIT %s OFFSET %s""",
+            [MARK_START, MARK_END, query, *scope_params, USER_WEIGHT, COMMENT_WEIGHT,
+             page_size + 1, offset],
+        )
+        rows = cursor.fetchall()
+
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    feedbacks = queryset.select_related('analysis').in_bulk([feedback_id for feedback_id, _ in rows])
+    results = []
+    for feedback_id, snippet in rows:
+        feedback = feedbacks.get(queryset.model._meta.pk.to_python(feedback_id))
+        if feedback is not None:
+            feedback.snippet = highlight(snippet)
+            results.append(feedback)
+    return results, has_next
@@ -1,7 +1,19 @@
 from django import template
 
+from store.images import cached_placeholder, variant_srcset
+
 register = template.Library()
 
 @register.filter(name='range')
 def range_filter(number):
     return range(number)
+
+@register.filter
+def srcset(image, fmt='jpeg'):
+    """srcset of the resized variants of a product image, '' when it has none"""
+    return variant_srcset(image or 'default_image.jpg', fmt)
+
+@register.filter
+def placeholder(image):
+    """Inline data: URI preview of a media file, '' when it cannot be read"""
+    return cached_placeholder(image)
@@ -0,0 +1,77 @@
+"""Per-client write throttling and duplicate suppression backed by the Django cache"""
+import hashlib
+import math
+import time
+from contextlib import contextmanager
+
+from django.core.cache import cache
+
+# How long a request waits for another one updating the same bucket, and how
+# long a lock outlives a process that died holding it
+LOCK_WAIT, LOCK_TIMEOUT = 0.5, 1
+
+
+def client_key(request):
+    """Identify the client by its logged in username, falling back to its address"""
+    username = request.session.get('username')
+    if username:
+        return f"user:{username}"
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+@contextmanager
+def cache_lock(key):
+    """Hold key exclusively across every process sharing the cache, yielding
+    False if it could not be taken within LOCK_WAIT seconds"""
+    lock_key = f"{key}:lock"
+    deadline = time.monotonic() + LOCK_WAIT
+    acquired = cache.add(lock_key, True, LOCK_TIMEOUT)
+    while not acquired and time.monotonic() < deadline:
+        time.sleep(0.01)
+        acquired = cache.add(lock_key, True, LOCK_TIMEOUT)
+    try:
+        yield acquired
+    finally:
+        if acquired:
+            cache.delete(lock_key)
+
+
+def take_token(scope, client, capacity, refill_rate):
+    """Spend one token from the client's bucket for scope.
+
+    The bucket holds up to capacity tokens and refills at refill_rate tokens
+    per second, so a client may burst capacity writes and then sustain
+    refill_rate. Returns 0 when the write is allowed, otherwise the seconds
+    until a token is available. Concurrent requests from one client update
+    the bucket one at a time, so a burst cannot spend the same token twice.
+    """
+    key = f"ratelimit:{scope}:{client}"
+    with cache_lock(key) as locked:
+        if not locked:
+            # Only a client already hammering this scope contends for its bucket
+            return 1 / refill_rate
+        now = time.time()
+        tokens, stamp = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - stamp) * refill_rate)
+        # An idle bucket is full again once its entry expires
+        timeout = math.ceil(capacity / refill_rate)
+        if tokens < 1:
+            cache.set(key, (tokens, now), timeout)
+            return (1 - tokens) / refill_rate
+        cache.set(key, (tokens - 1, now), timeout)
+        return 0
+
+
+def content_digest(*fields):
+    """Stable hash of normalized text fields, used to spot resubmitted content"""
+    normalized = "\x1f".join(" ".join(str(field).split()).casefold() for field in fields)
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def claim_digest(scope, digest, window):
+    """Remember digest for window seconds; False if it was already seen"""
+    return cache.add(f"{scope}-digest:{digest}", True, window)
+
+
+def release_digest(scope, digest):
+    cache.delete(f"{scope}-digest:{digest}")
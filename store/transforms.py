@@ -0,0 +1,134 @@
+"""Disk cache of on-demand image transforms, bounded by size in LRU order"""
+import hashlib
+import os
+import threading
+
+from django.conf import settings
+
+from .images import TRANSFORM_FORMATS, get_pool, render_transform
+from .ontology import file_lock
+
+LOCK_NAME = '.lock'
+
+# Bytes this process believes the cache holds; None until the first scan.
+# Other processes write too, so every prune rescans the directory.
+_cache_bytes = None
+_cache_lock = threading.Lock()
+
+
+def transform_key(source_path, stat, width, height, fmt, quality):
+    """Cache key of one rendering; a changed source file gets a new key"""
+    spec = f"{source_path}|{stat.st_mtime_ns}|{stat.st_size}|{width}|{height}|{fmt}|{quality}"
+    return hashlib.sha256(spec.encode()).hexdigest()
+
+
+def cache_entries(cache_dir):
+    """(mtime, size, path) of every cached rendering"""
+    entries = []
+    for directory, _, filenames in os.walk(cache_dir):
+        for filename in filenames:
+            if filename == LOCK_NAME or filename.endswith('.tmp'):
+                continue
+            path = os.path.join(directory, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue  # evicted by another process meanwhile
+            entries.append((stat.st_mtime, stat.st_size, path))
+    return entries
+
+
+def prune_cache(cache_dir, budget):
+    """Delete the least recently used renderings until the cache is within budget.
+
+    Evicts down to 90% of the budget so a busy cache is not rescanned on
+    every miss. Returns the bytes left in the cache.
+    """
+    entries = cache_entries(cache_dir)
+    total = sum(size for _, size, _ in entries)
+    if total <= budget:
+        return total
+    target = budget * 0.9
+    for _, size, path in sorted(entries):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue  # already gone, or still open on Windows
+        total -= size
+    return total
+
+
+def account(size):
+    """Add a new rendering to the running total, pruning when over budget"""
+    global _cache_bytes
+    cache_dir, budget = settings.IMAGE_TRANSFORM_CACHE_DIR, settings.IMAGE_TRANSFORM_CACHE_BYTES
+    with _cache_lock:
+        if _cache_bytes is None:
+            _cache_bytes = sum(size for _, size, _ in cache_entries(cache_dir))
+        else:
+            _cache_bytes += size
+        if _cache_bytes > budget:
+            _cache_bytes = prune_cache(cache_dir, budget)
+
+
+def touch(path):
+    """Mark a cache hit; mtime rather than atime, which noatime mounts never update"""
+    try:
+        os.utime(path)
+        return True
+    except OSError:
+        return False  # evicted between the lookup and now
+
+
+def transformed_image(source_path, stat, width, height, fmt, quality):
+    """Path and key of the cached rendering, rendering it first on a miss.
+
+    Concurrent misses for the same rendering, from any thread or process,
+    wait on a lock shared by their key prefix and only the first renders;
+    the others find its file when they get the lock.
+    """
+    key = transform_key(source_path, stat, width, height, fmt, quality)
+    directory = os.path.join(settings.IMAGE_TRANSFORM_CACHE_DIR, key[:2])
+    path = os.path.join(directory, f"{key}.{fmt}")
+    if os.path.exists(path) and touch(path):
+        return path, key
+
+    os.makedirs(directory, exist_ok=True)
+    with file_lock(os.path.join(directory, LOCK_NAME)):
+        if os.path.exists(path) and touch(path):
+            return path, key
+        get_pool().submit(
+            render_transform, source_path, path, width, height, fmt, quality
+        ).result()
+    account(os.path.getsize(path))
+    return path, key
+
+
+def parse_transform(params):
+    """Validate w, h, fmt and q query parameters into render arguments.
+
+    Sizes and qualities must come from IMAGE_TRANSFORM_SIZES and
+    IMAGE_TRANSFORM_QUALITIES, which bounds how many renderings one image
+    can have. Raises ValueError naming the offending parameter.
+    """
+    sizes = settings.IMAGE_TRANSFORM_SIZES
+    dimensions = []
+    for name in ('w', 'h'):
+        value = params.get(name)
+        if value in (None, ''):
+            dimensions.append(None)
+            continue
+        if not value.isdigit() or int(value) not in sizes:
+            raise ValueError(f"{name} must be one of {', '.join(map(str, sizes))}")
+        dimensions.append(int(value))
+    fmt = params.get('fmt', 'webp')
+    if fmt not in TRANSFORM_FORMATS:
+        raise ValueError(f"fmt must be one of {', '.join(TRANSFORM_FORMATS)}")
+    qualities = settings.IMAGE_TRANSFORM_QUALITIES
+    quality = params.get('q', '80')
+    if not quality.isdigit() or int(quality) not in qualities:
+        raise ValueError(f"q must be one of {', '.join(map(str, qualities))}")
+    # PNG is lossless, so quality must not split its cache entries
+    return dimensions[0], dimensions[1], fmt, int(quality) if fmt != 'png' else None
@@ -1,7 +1,8 @@
 from django.urls import path
 from .views import (
     UserProductView, AdminProductView, OrderView, AdminView, ViewOrdersView,
-    LoginView, UserDashboardView, FeedbackView, AddFeedbackView  # Remove view_feedbacks import
+    LoginView, UserDashboardView, FeedbackView, AddFeedbackView,  # Remove view_feedbacks import
+    CustomerOrdersView, AdminDashboardView, OrderExportView, FeedbackExportView
 )
 from django.shortcuts import render
 
@@ -13,8 +14,12 @@ urlpatterns = [
     path('order/', OrderView.as_view(), name='place_order'),
     path('baseAdmin/', AdminView.as_view(), name='baseAdmin'),
     path('orders/', ViewOrdersView.as_view(), name='view_orders'),
+    path('orders/export/', OrderExportView.as_view(), name='export_orders'),
+    path('analytics/', AdminDashboardView.as_view(), name='sales_analytics'),
+    path('my-orders/', CustomerOrdersView.as_view(), name='my_orders'),
     path('success/', lambda request: render(request, 'store/user/success.html'), name='order_success'),
     path('feedbacks/', FeedbackView.as_view(), name='view_feedbacks'),
+    path('feedbacks/export/', FeedbackExportView.as_view(), name='export_feedbacks'),
     path('feedback/add/', AddFeedbackView.as_view(), name='add_feedback'),
     path('adminproducts/<str:product_id>/', AdminProductView.as_view(), name='update_product'),
 ]
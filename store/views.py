@@ -1,38 +1,100 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect
+from django.http import HttpResponseBadRequest, StreamingHttpResponse
 from django.views import View
 from django.contrib import messages
 from django.conf import settings
-from .models import Feedback
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from .agents import FeedbackManagementAgent, ImageProcessingAgent, InventoryManagementAgent
+from .analysis import stored_insights
+from .archive import (
+    archive_partitions, iter_archived_orders, iter_merged_orders, merge_orders
+)
+from .indexes import (
+    add_product_ratings, index_products, product_ratings, record_deletions, referencing_subjects,
+    remove_references
+)
+from .identifiers import uuid7
+from .images import delete_unreferenced_images
+from .exports import (
+    EXPORT_FORMATS, FEEDBACK_FIELDS, ORDER_FIELDS, export_lines, iter_feedback, iter_order_rows,
+    iter_orders
+)
+from .models import (
+    CustomerOrderSummary, Feedback, FeedbackOutbox, IdempotencyKey, OrderEvent,
+    OrderIndex, ProductDailySales, ProductIndex
+)
+from .ontology import (
+    ECOM_NS, ONTOLOGY_PATH, graph_lock, load_graph, merge_changes,
+    parse_source, read_source, write_graph
+)
+from .search import search_feedback, search_feedback_ids
+from .throttling import claim_digest, client_key, content_digest, release_digest, take_token
 from django.contrib.auth import login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
-from rdflib import Graph, URIRef, Namespace, Literal
+from rdflib import Graph, URIRef, Literal
 from rdflib.namespace import RDF, XSD
-from django.core.paginator import Paginator
+import math
 import uuid
 import os
-from datetime import datetime
+from datetime import datetime, timedelta
 
 class BaseOntologyView(View):
     """Base view for handling RDF graph operations"""
     def __init__(self):
         super().__init__()
-        self.graph = Graph()
-        self.ontology_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 
-                                         'ontology', 'Ecommerce_Platform.xml')
-        try:
-            self.graph.parse(self.ontology_path)
-        except Exception as e:
-            print(f"Error loading ontology: {e}")
-            # Initialize empty graph if file doesn't exist
-            pass
-        self.ECOM_NS = Namespace("http://www.example.org/ecommerce_ontology#")
+        self.ontology_path = ONTOLOGY_PATH
+        self._graph = None
+        self._source, self._loaded_mtime = None, None
+        self.ECOM_NS = ECOM_NS
+
+    @property
+    def graph(self):
+        """The ontology, parsed on first use.
+
+        Views are built before dispatch, so loading here rather than in
+        __init__ keeps requests turned away by the login check or the rate
+        limiter from paying for a parse.
+        """
+        if self._graph is None:
+            self._graph = Graph()
+            try:
+                self._source, self._loaded_mtime = read_source(self.ontology_path)
+                self._graph = parse_source(self._source)
+            except Exception as e:
+                print(f"Error loading ontology: {e}")
+                # Initialize empty graph if file doesn't exist
+                pass
+        return self._graph
+
+    @graph.setter
+    def graph(self, graph):
+        self._graph = graph
     
-    def save_graph(self):
-        """Safely save the RDF graph to file"""
+    def is_deleted(self, product):
+        """Whether a product was retired (tombstoned) while orders still reference it"""
+        return (product, self.ECOM_NS.deleted, Literal(True)) in self.graph
+
+    def save_graph(self, released_images=()):
+        """Safely save the RDF graph to file, merging writes made since it was loaded.
+
+        released_images are hasImage values this request stopped using; their
+        files are deleted once the saved graph shows no product needs them.
+        """
         try:
-            self.graph.serialize(destination=self.ontology_path, format="xml")
+            with graph_lock():
+                if (os.path.exists(self.ontology_path) and
+                        os.stat(self.ontology_path).st_mtime_ns != self._loaded_mtime):
+                    base = parse_source(self._source) if self._source else Graph()
+                    self.graph = merge_changes(base, self.graph, load_graph(self.ontology_path))
+                write_graph(self.graph, self.ontology_path)
+                self._source, self._loaded_mtime = read_source(self.ontology_path)
+                delete_unreferenced_images(self.graph, released_images)
         except Exception as e:
             print(f"Error saving ontology: {e}")
             raise
@@ -76,14 +138,34 @@ class LoginView(View):
         messages.error(request, f'Invalid {form_type} credentials')
         return render(request, 'store/index.html', {'error': f'Invalid {form_type} credentials'})
 
-class AddFeedbackView(LoginRequiredMixin, BaseOntologyView):
-    """Handle user feedback submission with ontology integration"""
+class RateLimitMixin:
+    """Throttle POSTs per client with the token bucket configured in RATE_LIMITS"""
+    rate_limit_scope = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method == 'POST' and self.rate_limit_scope:
+            capacity, refill_rate = settings.RATE_LIMITS[self.rate_limit_scope]
+            wait = take_token(self.rate_limit_scope, client_key(request), capacity, refill_rate)
+            if wait:
+                messages.error(request, f'Too many requests. Please try again in '
+                                        f'{math.ceil(wait)} seconds.')
+                return redirect(request.path)
+        return super().dispatch(request, *args, **kwargs)
+
+
+class AddFeedbackView(LoginRequiredMixin, RateLimitMixin, View):
+    """Handle user feedback submission"""
+    rate_limit_scope = 'feedback'
+
     def get(self, request):
         if request.session.get('user_type') != 'user':
             raise PermissionDenied
             
+        promotional_products, regular_products = UserProductView().get_products_by_discount()
         context = {
             'range': range(5),  # For star rating display
+            'products': sorted(promotional_products + regular_products, key=lambda p: p['name']),
+            'selected_product': request.GET.get('product', ''),
         }
         return render(request, 'store/user/add_feedback.html', context)
     
@@ -98,6 +180,7 @@ class AddFeedbackView(LoginRequiredMixin, BaseOntologyView):
             email = request.POST.get('email')
             rating = request.POST.get('rating')
             feedback_text = request.POST.get('feedback')
+            product_id = request.POST.get('product', '').strip()
             
             # Validate required fields
             if not all([name, email, rating, feedback_text]):
@@ -112,35 +195,35 @@ class AddFeedbackView(LoginRequiredMixin, BaseOntologyView):
             except (TypeError, ValueError):
                 messages.error(request, 'Invalid rating value')
                 return redirect('add_feedback')
-                
-            # Generate UUID first - this will be used for both database and ontology
-            feedback_id = str(uuid.uuid4())
-            
-            # Create feedback in database with the same UUID
-            feedback = Feedback.objects.create(
-                id=feedback_id,  # Use the UUID as the primary key
-                user=name,
-                rating=rating,
-                comment=feedback_text
-            )
-            
-            # Add feedback to ontology using the same UUID
-            feedback_uri = URIRef(self.ECOM_NS + feedback_id)
             
-            # Add feedback properties to graph
-            feedback_properties = [
-                (RDF.type, self.ECOM_NS.Feedback),
-                (self.ECOM_NS.feedbackUser, Literal(name, datatype=XSD.string)),
-                (self.ECOM_NS.userEmail, Literal(email, datatype=XSD.string)),
-                (self.ECOM_NS.rating, Literal(rating, datatype=XSD.integer)),
-                (self.ECOM_NS.comment, Literal(feedback_text, datatype=XSD.string)),
-                (self.ECOM_NS.submissionDate, Literal(datetime.now().isoformat(), datatype=XSD.dateTime))
-            ]
-            
-            for predicate, obj in feedback_properties:
-                self.graph.add((feedback_uri, predicate, obj))
+            # Reviews only count towards products that are still in the catalog
+            if product_id and not ProductIndex.objects.filter(
+                    product_id=product_id, deleted=False).exists():
+                messages.error(request, 'Product not found')
+                return redirect('add_feedback')
                 
-            self.save_graph()
+            # Drop resubmissions of the same feedback (double clicks, replays)
+            digest = content_digest(name, email, product_id, rating, feedback_text)
+            if not claim_digest('feedback', digest, settings.FEEDBACK_DUPLICATE_WINDOW):
+                messages.success(request, 'Thank you for your feedback!')
+                return redirect('add_feedback')
+            
+            # One insert plus its outbox entry; the FeedbackProjectionAgent
+            # copies the feedback into the ontology afterwards
+            try:
+                with transaction.atomic():
+                    feedback = Feedback.objects.create(
+                        user=name,
+                        email=email,
+                        product_id=product_id,
+                        rating=rating,
+                        comment=feedback_text
+                    )
+                    FeedbackOutbox.objects.create(feedback_id=feedback.id)
+                    add_product_ratings([feedback])
+            except Exception:
+                release_digest('feedback', digest)
+                raise
             
             messages.success(request, 'Thank you for your feedback!')
             return redirect('add_feedback')
@@ -150,81 +233,154 @@ class AddFeedbackView(LoginRequiredMixin, BaseOntologyView):
             return redirect('add_feedback')
 
 
-class FeedbackView(LoginRequiredMixin, BaseOntologyView):
-    """View for handling feedback display and management with ontology integration"""
+class FeedbackView(LoginRequiredMixin, View):
+    """View for handling feedback display and management"""
+    PAGE_SIZE = 10
+
+    @staticmethod
+    def encode_cursor(feedback):
+        return f"{feedback.created_at.isoformat()}~{feedback.id.hex}"
+
+    @staticmethod
+    def decode_cursor(value):
+        """Return (created_at, id) from a page cursor, or None if it is malformed"""
+        try:
+            created_at, feedback_id = value.split('~')
+            created_at = datetime.fromisoformat(created_at)
+            return created_at, uuid.UUID(feedback_id)
+        except (AttributeError, ValueError):
+            return None
+
+    def filter_feedback(self, params):
+        """Feedback matching the moderation, rating and product filters in params"""
+        queryset = Feedback.objects.all()
+        if params.get('moderation') in dict(Feedback.MODERATION_CHOICES):
+            queryset = queryset.filter(moderation=params['moderation'])
+        if params.get('rating', '').isdigit():
+            queryset = queryset.filter(rating=int(params['rating']))
+        if params.get('product'):
+            queryset = queryset.filter(product_id=params['product'])
+        return queryset
+
+    def get_page(self, queryset, before=None, after=None):
+        """Keyset page of feedback, newest first, around a (created_at, id) cursor.
+
+        Walks the (created_at, id) index, so every page costs one indexed
+        range scan of PAGE_SIZE + 1 rows however much feedback exists.
+        Returns (feedbacks, has_newer, has_older).
+        """
+        queryset = queryset.select_related('analysis')
+        if after:
+            created_at, feedback_id = after
+            rows = list(queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=feedback_id)
+            ).order_by('created_at', 'id')[:self.PAGE_SIZE + 1])
+            has_newer = len(rows) > self.PAGE_SIZE
+            return rows[:self.PAGE_SIZE][::-1], has_newer, True
+
+        if before:
+            created_at, feedback_id = before
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=feedback_id)
+            )
+        rows = list(queryset.order_by('-created_at', '-id')[:self.PAGE_SIZE + 1])
+        return rows[:self.PAGE_SIZE], bool(before), len(rows) > self.PAGE_SIZE
+
     def get(self, request):
         if request.session.get('user_type') != 'admin':
             raise PermissionDenied
-            
-        feedbacks = []
-        # Query all feedback from ontology
-        for feedback in self.graph.subjects(RDF.type, self.ECOM_NS.Feedback):
-            try:
-                feedback_data = {
-                    'id': str(feedback).split('#')[-1],
-                    'user': str(self.graph.value(feedback, self.ECOM_NS.feedbackUser)),
-                    'email': str(self.graph.value(feedback, self.ECOM_NS.userEmail)),
-                    'rating': int(self.graph.value(feedback, self.ECOM_NS.rating)),
-                    'comment': str(self.graph.value(feedback, self.ECOM_NS.comment)),
-                    'created_at': self.graph.value(feedback, self.ECOM_NS.submissionDate)
-                }
-                feedbacks.append(feedback_data)
-            except Exception as e:
-                print(f"Error processing feedback {feedback}: {str(e)}")
-                continue
-        
-        # Sort feedbacks by submission date (newest first)
-        feedbacks.sort(key=lambda x: x['created_at'], reverse=True)
-        
-        # Paginate the feedback list
-        paginator = Paginator(feedbacks, 10)
-        page = request.GET.get('page')
-        paginated_feedbacks = paginator.get_page(page)
-        
-        context = {
-            'feedbacks': paginated_feedbacks,
+
+        queryset = self.filter_feedback(request.GET)
+        search = request.GET.get('q', '').strip()
+        context = {'search': search}
+        if search:
+            # Ranked results can't be keyset paged, so search pages by offset
+            page = request.GET.get('page', '')
+            page = int(page) if page.isdigit() and int(page) > 0 else 1
+            feedbacks, has_next = search_feedback(queryset, search, page, self.PAGE_SIZE)
+            context.update({
+                'page': page,
+                'previous_page': page - 1 if page > 1 else None,
+                'next_page': page + 1 if has_next else None,
+            })
+        else:
+            feedbacks, has_newer, has_older = self.get_page(
+                queryset,
+                before=self.decode_cursor(request.GET.get('before')),
+                after=self.decode_cursor(request.GET.get('after')),
+            )
+            context.update({
+                'newer_cursor': self.encode_cursor(feedbacks[0]) if feedbacks and has_newer else None,
+                'older_cursor': self.encode_cursor(feedbacks[-1]) if feedbacks and has_older else None,
+            })
+        insights, insights_at = stored_insights()
+        context.update({
+            'feedbacks': feedbacks,
+            'filters': request.GET,
+            'moderation_choices': Feedback.MODERATION_CHOICES,
+            'insights': insights,
+            'insights_at': insights_at,
             'star_range': range(5)
-        }
+        })
         return render(request, 'store/admin/feedbacks.html', context)
     
     def post(self, request):
-        """Handle feedback deletion from both database and ontology"""
+        """Approve, hide or delete the selected (or all matching) feedback"""
         if request.session.get('user_type') != 'admin':
             raise PermissionDenied
             
         try:
-            feedback_id = request.POST.get('feedback_id')
-            if not feedback_id:
-                messages.error(request, 'Feedback ID is required')
-                return redirect('view_feedbacks')
-            
-            # Create the full URI for the feedback
-            feedback_uri = URIRef(self.ECOM_NS + feedback_id)
-            
-            # Check if feedback exists in the ontology
-            if (feedback_uri, RDF.type, self.ECOM_NS.Feedback) not in self.graph:
-                messages.error(request, 'Feedback not found in the system')
-                return redirect('view_feedbacks')
-            
-            # Delete from database (if it exists)
-            try:
-                feedback = get_object_or_404(Feedback, id=feedback_id)
-                feedback.delete()
-            except Exception as e:
-                print(f"Database deletion error (non-critical): {str(e)}")
-            
-            # Delete from ontology
-            for p, o in list(self.graph.predicate_objects(feedback_uri)):
-                self.graph.remove((feedback_uri, p, o))
+            if request.POST.get('delete_one'):
+                action, feedback_ids = 'delete', [request.POST['delete_one']]
+            else:
+                action = request.POST.get('action')
+                if request.POST.get('select_all_matching'):
+                    # "All matching" means the page's search as well as its filters
+                    queryset = self.filter_feedback(request.GET)
+                    search = request.GET.get('q', '').strip()
+                    if search:
+                        feedback_ids = search_feedback_ids(queryset, search)
+                    else:
+                        feedback_ids = list(queryset.values_list('id', flat=True))
+                else:
+                    feedback_ids = request.POST.getlist('feedback_ids')
             
-            self.save_graph()
+            if action not in FeedbackManagementAgent.MODERATION_ACTIONS:
+                messages.error(request, 'Invalid moderation action')
+                return redirect(request.get_full_path())
+            if not feedback_ids:
+                messages.error(request, 'No feedback selected')
+                return redirect(request.get_full_path())
             
-            messages.success(request, 'Feedback deleted successfully')
+            feedback_ids = [uuid.UUID(str(feedback_id)) for feedback_id in feedback_ids]
+            changed = FeedbackManagementAgent().moderate(feedback_ids, action)
+            if changed:
+                verb = {'approve': 'approved', 'hide': 'hidden', 'delete': 'deleted'}[action]
+                messages.success(request, f'{changed} feedback(s) {verb}')
+            else:
+                messages.error(request, 'No matching feedback found')
             
         except Exception as e:
-            messages.error(request, f'Error deleting feedback: {str(e)}')
+            messages.error(request, f'Error moderating feedback: {str(e)}')
         
-        return redirect('view_feedbacks')
+        return redirect(request.get_full_path())
+
+class FeedbackExportView(LoginRequiredMixin, View):
+    """Stream all feedback as CSV or NDJSON"""
+    def get(self, request):
+        if request.session.get('user_type') != 'admin':
+            raise PermissionDenied
+        
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest('Unsupported export format')
+        
+        response = StreamingHttpResponse(
+            export_lines(iter_feedback(), FEEDBACK_FIELDS, export_format),
+            content_type=EXPORT_FORMATS[export_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="feedback.{export_format}"'
+        return response
 
 class UserDashboardView(LoginRequiredMixin, BaseOntologyView):
     """User dashboard view with integrated product display"""
@@ -245,29 +401,68 @@ class UserDashboardView(LoginRequiredMixin, BaseOntologyView):
         }
         return render(request, 'store/baseUser.html', context)
 
-class AdminDashboardView(LoginRequiredMixin, BaseOntologyView):
-    """Admin dashboard view"""
+class AdminDashboardView(LoginRequiredMixin, View):
+    """Sales analytics served from the incremental sales rollups"""
+    DAYS = 30
+
     def get(self, request):
         if request.session.get('user_type') != 'admin':
             raise PermissionDenied
-        return render(request, 'store/baseAdmin.html')
+        
+        since = timezone.localdate() - timedelta(days=self.DAYS - 1)
+        recent = ProductDailySales.objects.filter(day__gte=since)
+        
+        by_day = {
+            row['day']: row for row in
+            recent.values('day').annotate(
+                revenue=Sum('revenue'), units=Sum('units'), orders=Sum('order_count')
+            ).order_by()
+        }
+        days = [since + timedelta(days=i) for i in range(self.DAYS)]
+        chart = {
+            'labels': [day.isoformat() for day in days],
+            'revenue': [round(by_day.get(day, {}).get('revenue') or 0, 2) for day in days],
+            'units': [by_day.get(day, {}).get('units') or 0 for day in days],
+        }
+        
+        top_products = recent.values('product_id').annotate(
+            name=Max('product_name'), revenue=Sum('revenue'), units=Sum('units')
+        ).order_by('-revenue')[:10]
+        
+        return render(request, 'store/admin/analytics.html', {
+            'chart': chart,
+            'days': self.DAYS,
+            'total_revenue': sum(chart['revenue']),
+            'total_units': sum(chart['units']),
+            'total_orders': sum(row['orders'] or 0 for row in by_day.values()),
+            'top_products': top_products,
+            'top_customers': CustomerOrderSummary.objects.order_by('-total_spent')[:10],
+        })
 
 class ProductView(BaseOntologyView):
     """Base class for product views"""
     def get_products_by_discount(self):
         promotional_products = []
         regular_products = []
+        # Stock held by queued orders the agent has not applied yet
+        reserved = OrderEvent.reserved_quantities()
         
         for product in self.graph.subjects(RDF.type, self.ECOM_NS.Product):
+            if self.is_deleted(product):
+                continue
             try:
                 product_data = {
+                    'id': str(product).split('#')[-1],
                     'name': str(self.graph.value(product, self.ECOM_NS.name)),
                     'price': float(self.graph.value(product, self.ECOM_NS.price)),
-                    'stock': int(self.graph.value(product, self.ECOM_NS.stockLevel)),
+                    'stock': max(int(self.graph.value(product, self.ECOM_NS.stockLevel))
+                                 - reserved.get(str(product).split('#')[-1], 0), 0),
                     'discount': float(self.graph.value(product, self.ECOM_NS.discount, 
                                                      default=Literal(0.0))),
                     'image': str(self.graph.value(product, self.ECOM_NS.hasImage, 
-                                                default=Literal("default_image.jpg")))
+                                                default=Literal("default_image.jpg"))),
+                    'placeholder': str(self.graph.value(product, self.ECOM_NS.imagePlaceholder,
+                                                      default=Literal("")))
                 }
                 product_data['final_price'] = round(
                     product_data['price'] * (1 - product_data['discount']/100), 2
@@ -287,15 +482,30 @@ class ProductView(BaseOntologyView):
 
 class UserProductView(LoginRequiredMixin, ProductView):
     """User product listing view"""
+    # Unrated products sort last
+    SORT_KEYS = {
+        'rating': lambda p: p['rating'].score if p['rating'] else 0,
+        'reviews': lambda p: p['rating'].rating_count if p['rating'] else 0,
+    }
+
     def get(self, request):
         if request.session.get('user_type') != 'user':
             raise PermissionDenied
             
         promotional_products, regular_products = self.get_products_by_discount()
+        ratings = product_ratings([p['id'] for p in promotional_products + regular_products])
+        for product in promotional_products + regular_products:
+            product['rating'] = ratings.get(product['id'])
+
+        sort = request.GET.get('sort', '')
+        if sort in self.SORT_KEYS:
+            for products in (promotional_products, regular_products):
+                products.sort(key=self.SORT_KEYS[sort], reverse=True)
         
         return render(request, 'store/user/userproducts.html', {
             'promotional_products': promotional_products,
             'regular_products': regular_products,
+            'sort': sort,
             'MEDIA_URL': settings.MEDIA_URL
         })
 
@@ -304,6 +514,8 @@ class AdminProductView(LoginRequiredMixin, ProductView):
     def get_all_products(self):
         products = []
         for product in self.graph.subjects(RDF.type, self.ECOM_NS.Product):
+            if self.is_deleted(product):
+                continue
             try:
                 product_id = str(product).split('#')[-1]
                 product_data = {
@@ -312,7 +524,8 @@ class AdminProductView(LoginRequiredMixin, ProductView):
                     'price': float(self.graph.value(product, self.ECOM_NS.price)),
                     'stock': int(self.graph.value(product, self.ECOM_NS.stockLevel)),
                     'discount': float(self.graph.value(product, self.ECOM_NS.discount, default=Literal(0.0))),
-                    'image': str(self.graph.value(product, self.ECOM_NS.hasImage, default=Literal("default_image.jpg")))
+                    'image': str(self.graph.value(product, self.ECOM_NS.hasImage, default=Literal("default_image.jpg"))),
+                    'placeholder': str(self.graph.value(product, self.ECOM_NS.imagePlaceholder, default=Literal("")))
                 }
                 products.append(product_data)
             except Exception as e:
@@ -327,7 +540,8 @@ class AdminProductView(LoginRequiredMixin, ProductView):
         if product_id:
             try:
                 product_uri = URIRef(self.ECOM_NS + product_id)
-                if (product_uri, RDF.type, self.ECOM_NS.Product) not in self.graph:
+                if ((product_uri, RDF.type, self.ECOM_NS.Product) not in self.graph
+                        or self.is_deleted(product_uri)):
                     messages.error(request, 'Product not found')
                     return redirect('admin_product_list')
                 
@@ -337,7 +551,8 @@ class AdminProductView(LoginRequiredMixin, ProductView):
                     'price': float(self.graph.value(product_uri, self.ECOM_NS.price)),
                     'stock': int(self.graph.value(product_uri, self.ECOM_NS.stockLevel)),
                     'discount': float(self.graph.value(product_uri, self.ECOM_NS.discount, default=Literal(0.0))),
-                    'image': str(self.graph.value(product_uri, self.ECOM_NS.hasImage, default=Literal("default_image.jpg")))
+                    'image': str(self.graph.value(product_uri, self.ECOM_NS.hasImage, default=Literal("default_image.jpg"))),
+                    'placeholder': str(self.graph.value(product_uri, self.ECOM_NS.imagePlaceholder, default=Literal("")))
                 }
                 return render(request, 'store/admin/update_product.html', {'product': product})
             except Exception as e:
@@ -356,25 +571,38 @@ class AdminProductView(LoginRequiredMixin, ProductView):
         try:
             product_uri = URIRef(self.ECOM_NS + product_id)
             
-            if (product_uri, RDF.type, self.ECOM_NS.Product) not in self.graph:
+            if ((product_uri, RDF.type, self.ECOM_NS.Product) not in self.graph
+                    or self.is_deleted(product_uri)):
                 messages.error(request, 'Product not found')
                 return redirect('admin_product_list')
 
             action = request.POST.get('action')
 
+            cascaded_orders = []
+            released_images = []
+            image = None
             if action == 'delete':
-                # Get current image path before deleting
-                current_image = str(self.graph.value(product_uri, self.ECOM_NS.hasImage))
-                if current_image and current_image != "default_image.jpg":
-                    # Delete the image file if it exists
-                    image_path = os.path.join(settings.MEDIA_ROOT, current_image)
-                    if os.path.exists(image_path):
-                        os.remove(image_path)
-
-                # Remove all triples about this product
-                for p, o in self.graph.predicate_objects(product_uri):
-                    self.graph.remove((product_uri, p, o))
-                messages.success(request, 'Product deleted successfully')
+                # Orders still pointing at this product, from the reverse index
+                referencing_orders = referencing_subjects(product_uri, self.ECOM_NS.product)
+
+                if referencing_orders and settings.PRODUCT_DELETE_POLICY == 'tombstone':
+                    # Keep the product's triples so its orders stay resolvable,
+                    # but retire it from the catalog
+                    self.graph.set((product_uri, self.ECOM_NS.deleted, Literal(True)))
+                    messages.success(request, f'Product retired; {len(referencing_orders)} '
+                                              f'order(s) still reference it')
+                else:
+                    # Cascade: the referencing orders go with the product
+                    for order in referencing_orders:
+                        self.graph.remove((order, None, None))
+                    cascaded_orders = referencing_orders
+
+                    # The image file goes too unless another product shares it
+                    released_images.append(self.graph.value(product_uri, self.ECOM_NS.hasImage))
+
+                    # Remove all triples about this product
+                    self.graph.remove((product_uri, None, None))
+                    messages.success(request, 'Product deleted successfully')
                 
             elif action == 'update':
                 # Update basic product information
@@ -387,47 +615,42 @@ class AdminProductView(LoginRequiredMixin, ProductView):
                                                  datatype=XSD.float)
                 }
 
-                # Handle image update
-                if request.FILES.get('image'):
-                    # Delete old image if it exists and isn't the default
-                    current_image = str(self.graph.value(product_uri, self.ECOM_NS.hasImage))
-                    if current_image and current_image != "default_image.jpg":
-                        old_image_path = os.path.join(settings.MEDIA_ROOT, current_image)
-                        if os.path.exists(old_image_path):
-                            os.remove(old_image_path)
-
-                    # Save new image
-                    image = request.FILES['image']
-                    image_path = os.path.join('product_images', image.name)
-                    full_path = os.path.join(settings.MEDIA_ROOT, image_path)
-                    
-                    # Ensure directory exists
-                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
-                    
-                    with open(full_path, 'wb+') as f:
-                        for chunk in image.chunks():
-                            f.write(chunk)
-                    
-                    updates[self.ECOM_NS.hasImage] = Literal(image_path, datatype=XSD.string)
+                # A new image is processed in the background by the
+                # ImageProcessingAgent; the current one shows until then
+                image = request.FILES.get('image')
 
-                # Update the graph
+                # Update the graph; set() also replaces falsy values such as a 0.0 discount
                 for predicate, new_value in updates.items():
-                    old_value = self.graph.value(product_uri, predicate)
-                    if old_value:
-                        self.graph.remove((product_uri, predicate, old_value))
-                    self.graph.add((product_uri, predicate, new_value))
+                    self.graph.set((product_uri, predicate, new_value))
 
                 messages.success(request, 'Product updated successfully')
+                if image:
+                    messages.info(request, 'The new image will appear once it has been processed')
 
-            self.save_graph()
+            self.save_graph(released_images)
+            # Staged only now, so a failed save leaves no unreferenced upload behind
+            if image:
+                ImageProcessingAgent.enqueue(product_id, image)
+
+            with transaction.atomic():
+                index_products(self.graph, [product_uri])
+                if action == 'delete':
+                    order_ids = [str(order).split('#')[-1] for order in cascaded_orders]
+                    for start in range(0, len(order_ids), 500):
+                        chunk = OrderIndex.objects.filter(order_id__in=order_ids[start:start + 500])
+                        record_deletions(list(chunk))
+                        chunk.delete()
+                    remove_references(cascaded_orders + [product_uri])
             return redirect('admin_product_list')
             
         except Exception as e:
             messages.error(request, f'Error processing product: {str(e)}')
             return redirect('admin_product_list')
 
-class OrderView(LoginRequiredMixin, BaseOntologyView):
+class OrderView(LoginRequiredMixin, RateLimitMixin, View):
     """Handle order creation and management"""
+    rate_limit_scope = 'order'
+
     def get(self, request):
         if request.session.get('user_type') != 'user':
             raise PermissionDenied
@@ -441,98 +664,318 @@ class OrderView(LoginRequiredMixin, BaseOntologyView):
         
         return render(request, 'store/user/order_form.html', {
             'products': all_products,
+            'idempotency_key': uuid.uuid4().hex,
             'MEDIA_URL': settings.MEDIA_URL
         })
     
+    def get_idempotency_key(self, request):
+        """Scope the client's key (header or form field) to the customer"""
+        key = request.headers.get('Idempotency-Key') or request.POST.get('idempotency_key')
+        if not key:
+            return None
+        return f"{request.session.get('username', 'Unknown')}:{key}"[:255]
+    
     def post(self, request):
+        """Validate the order, reserve stock and queue it for the InventoryManagementAgent"""
         try:
+            # A retry of an order we already accepted gets the original result
+            idempotency_key = self.get_idempotency_key(request)
+            if idempotency_key and cache.get(f'order-idempotency:{idempotency_key}'):
+                return redirect('order_success')
+            
             product_name = request.POST.get('product_name')
             quantity = int(request.POST.get('quantity', 0))
             
             # Validate input
             if quantity <= 0:
                 messages.error(request, 'Quantity must be greater than 0')
-                return redirect('order')
-            
-            # Find product
-            product = next(
-                (p for p in self.graph.subjects(self.ECOM_NS.name, 
-                Literal(product_name, datatype=XSD.string))), None
-            )
-            
-            if not product:
-                messages.error(request, 'Product not found')
-                return redirect('order')
-            
-            # Check stock
-            stock = int(self.graph.value(product, self.ECOM_NS.stockLevel))
-            if stock < quantity:
-                messages.error(request, f'Insufficient stock. Only {stock} available')
-                return redirect('order')
-            
-            # Get product price and discount
-            price = float(self.graph.value(product, self.ECOM_NS.price))
-            discount = float(self.graph.value(product, self.ECOM_NS.discount, 
-                                            default=Literal(0.0)))
-            
-            # Calculate final price
-            final_price = price * (1 - discount/100)
-            
-            # Create order
-            order_id = str(uuid.uuid4())
-            order = URIRef(self.ECOM_NS + order_id)
+                return redirect('place_order')
             
-            # Add order details
-            order_data = [
-                (RDF.type, self.ECOM_NS.Order),
-                (self.ECOM_NS.customer, Literal(request.session.get('username', 'Unknown'), 
-                                              datatype=XSD.string)),
-                (self.ECOM_NS.product, product),
-                (self.ECOM_NS.quantity, Literal(quantity, datatype=XSD.integer)),
-                (self.ECOM_NS.price, Literal(final_price, datatype=XSD.float)),
-                (self.ECOM_NS.status, Literal("pending", datatype=XSD.string)),
-                (self.ECOM_NS.orderDate, Literal(datetime.now().isoformat(), 
-                                               datatype=XSD.dateTime))
-            ]
-            
-            for predicate, obj in order_data:
-                self.graph.add((order, predicate, obj))
-            
-            # Update stock
-            self.graph.set((product, self.ECOM_NS.stockLevel, Literal(stock - quantity)))
+            # Reserve stock against orders still waiting in the queue. The
+            # product index and the reservations are read in one transaction:
+            # the agent moves stock out of the index in the same commit that
+            # releases a reservation
+            with transaction.atomic():
+                if idempotency_key:
+                    # Keys past the TTL are ignored even before the agent prunes them
+                    previous = IdempotencyKey.objects.filter(
+                        key=idempotency_key,
+                        created_at__gte=timezone.now() - timedelta(
+                            seconds=settings.ORDER_IDEMPOTENCY_TTL),
+                    ).first()
+                    if previous:
+                        cache.set(f'order-idempotency:{idempotency_key}', previous.order_id,
+                                  settings.ORDER_IDEMPOTENCY_TTL)
+                        return redirect('order_success')
+                
+                product = ProductIndex.objects.filter(name=product_name, deleted=False).first()
+                if not product:
+                    messages.error(request, 'Product not found')
+                    return redirect('place_order')
+                
+                product_id = product.product_id
+                price, discount = product.price, product.discount
+                final_price = price * (1 - discount/100)
+                
+                reserved = OrderEvent.reserved_quantities([product_id]).get(product_id, 0)
+                available = product.stock_level - reserved
+                if available < quantity:
+                    messages.error(request, f'Insufficient stock. Only {max(available, 0)} available')
+                    return redirect('place_order')
+                
+                event = OrderEvent.objects.create(
+                    order_id=str(uuid7()),
+                    customer=request.session.get('username', 'Unknown'),
+                    product_id=product_id,
+                    product_name=product_name,
+                    unit_price=price,
+                    discount=discount,
+                    quantity=quantity,
+                    price=final_price,
+                    order_date=timezone.now()
+                )
+                if idempotency_key:
+                    # Takes over an expired row for the same key that is not pruned yet
+                    IdempotencyKey.objects.update_or_create(
+                        key=idempotency_key,
+                        defaults={'order_id': event.order_id, 'created_at': timezone.now()},
+                    )
             
-            self.save_graph()
+            if idempotency_key:
+                cache.set(f'order-idempotency:{idempotency_key}', event.order_id,
+                          settings.ORDER_IDEMPOTENCY_TTL)
             messages.success(request, 'Order placed successfully!')
             return redirect('order_success')
             
         except Exception as e:
             messages.error(request, f'Error processing order: {str(e)}')
-            return redirect('order')
+            return redirect('place_order')
+
+class CustomerOrdersView(LoginRequiredMixin, View):
+    """Order history for the logged in customer"""
+    PAGE_SIZE = 10
+    # How long an order the agent rejected stays listed with its reason
+    FAILED_ORDER_DAYS = 30
+
+    def get(self, request):
+        if request.session.get('user_type') != 'user':
+            raise PermissionDenied
+        
+        customer = request.session.get('username', 'Unknown')
+        params = request.GET.copy()
+        params['customer'] = customer
+        params.pop('status', None)
+        params.pop('sort', None)
+        try:
+            orders, previous_cursor, next_cursor = ViewOrdersView().get_page(params, self.PAGE_SIZE)
+        except ValueError:
+            messages.error(request, 'Invalid date filter')
+            orders, previous_cursor, next_cursor = ViewOrdersView().get_page(
+                {'customer': customer}, self.PAGE_SIZE
+            )
+        
+        # Orders still waiting for the InventoryManagementAgent
+        queued_orders = OrderEvent.objects.filter(
+            status__in=OrderEvent.RESERVING, customer=customer
+        ).order_by('-order_date')
+        # Orders the agent could not apply never reach the order index
+        failed_orders = OrderEvent.objects.filter(
+            status=OrderEvent.FAILED, customer=customer,
+            order_date__gte=timezone.now() - timedelta(days=self.FAILED_ORDER_DAYS),
+        ).order_by('-order_date')
+        
+        return render(request, 'store/user/my_orders.html', {
+            'orders': orders,
+            'previous_cursor': previous_cursor,
+            'next_cursor': next_cursor,
+            'queued_orders': queued_orders,
+            'failed_orders': failed_orders,
+            'summary': CustomerOrderSummary.objects.filter(customer=customer).first(),
+            'filters': request.GET,
+        })
+
+class ViewOrdersView(LoginRequiredMixin, View):
+    """View and manage orders from the order index"""
+    PAGE_SIZE = 25
+
+    @staticmethod
+    def is_descending(params):
+        """Listings sort by date only: ?sort=date for oldest first, newest first otherwise"""
+        return params.get('sort', '-date') != 'date'
+
+    @staticmethod
+    def encode_cursor(order):
+        return f"{order.order_date.isoformat()}~{order.order_id}"
+
+    @staticmethod
+    def decode_cursor(value):
+        """Return (order_date, order_id) from a page cursor, or None if it is malformed"""
+        try:
+            order_date, order_id = value.split('~', 1)
+            order_date = datetime.fromisoformat(order_date)
+            if timezone.is_naive(order_date):
+                return None
+            return order_date, order_id
+        except (AttributeError, ValueError):
+            return None
+
+    def filter_orders(self, params):
+        """Apply the listing filters and date order from the query string"""
+        orders = OrderIndex.objects.all()
+        if params.get('status'):
+            orders = orders.filter(status=params['status'])
+        if params.get('customer'):
+            orders = orders.filter(customer=params['customer'])
+
+        date_from = parse_date(params.get('date_from') or '')
+        if date_from:
+            orders = orders.filter(order_date__gte=timezone.make_aware(
+                datetime.combine(date_from, datetime.min.time())))
+        date_to = parse_date(params.get('date_to') or '')
+        if date_to:
+            orders = orders.filter(order_date__lt=timezone.make_aware(
+                datetime.combine(date_to + timedelta(days=1), datetime.min.time())))
+
+        direction = '-' if self.is_descending(params) else ''
+        return orders.order_by(f'{direction}order_date', f'{direction}order_id')
+
+    def walk_orders(self, params, descending, cursor, limit):
+        """Up to limit filtered orders past cursor in (order_date, order_id) order.
+
+        Both listings' filters are covered by the (status|customer,
+        order_date, order_id) indexes, so this is one range scan of limit
+        rows. With a start date it reads through to the archive too.
+        """
+        direction = '-' if descending else ''
+        orders = self.filter_orders(params).order_by(f'{direction}order_date',
+                                                     f'{direction}order_id')
+        date_from = parse_date(params.get('date_from') or '')
+        date_to = parse_date(params.get('date_to') or '') or timezone.localdate()
+        if cursor:
+            order_date, order_id = cursor
+            if descending:
+                orders = orders.filter(Q(order_date__lt=order_date)
+                                       | Q(order_date=order_date, order_id__lt=order_id))
+                date_to = min(date_to, timezone.localdate(order_date))
+            else:
+                orders = orders.filter(Q(order_date__gt=order_date)
+                                       | Q(order_date=order_date, order_id__gt=order_id))
+                date_from = max(date_from, timezone.localdate(order_date)) if date_from else None
+
+        if not date_from or not archive_partitions(date_from, date_to):
+            return list(orders[:limit])
+        archived = iter_archived_orders(date_from, date_to, status=params.get('status'),
+                                        customer=params.get('customer'), descending=descending)
+        if cursor:
+            # The cursor's own day partition also holds rows on its near side
+            past = (lambda key: key < cursor) if descending else (lambda key: key > cursor)
+            archived = (row for row in archived if past((row.order_date, row.order_id)))
+        return merge_orders(orders, archived, descending, limit)
+
+    def get_page(self, params, page_size):
+        """Keyset page of the filtered orders after (or before) the cursor in params.
+
+        Returns (orders, previous_cursor, next_cursor); a cursor is None
+        when there is no page that way. Nothing is counted, so every page
+        costs the same however many orders match.
+        """
+        after = self.decode_cursor(params.get('after'))
+        before = None if after else self.decode_cursor(params.get('before'))
+        descending = self.is_descending(params)
+        if before:
+            # Walk back from the cursor and flip the rows into listing order
+            rows = self.walk_orders(params, not descending, before, page_size + 1)
+            has_previous, has_next = len(rows) > page_size, True
+            rows = rows[:page_size][::-1]
+        else:
+            rows = self.walk_orders(params, descending, after, page_size + 1)
+            has_previous, has_next = after is not None, len(rows) > page_size
+            rows = rows[:page_size]
+        return (
+            rows,
+            self.encode_cursor(rows[0]) if rows and has_previous else None,
+            self.encode_cursor(rows[-1]) if rows and has_next else None,
+        )
 
-class ViewOrdersView(LoginRequiredMixin, BaseOntologyView):
-    """View and manage orders"""
     def get(self, request):
         if request.session.get('user_type') != 'admin':
             raise PermissionDenied
+        
+        try:
+            orders, previous_cursor, next_cursor = self.get_page(request.GET, self.PAGE_SIZE)
+        except ValueError:
+            messages.error(request, 'Invalid date filter')
+            orders, previous_cursor, next_cursor = self.get_page({}, self.PAGE_SIZE)
             
-        orders = []
-        for order in self.graph.subjects(RDF.type, self.ECOM_NS.Order):
-            try:
-                order_data = {
-                    'id': str(order).split('#')[-1],
-                    'customer': str(self.graph.value(order, self.ECOM_NS.customer) or "Unknown"),
-                    'product': str(self.graph.value(self.graph.value(order, self.ECOM_NS.product), 
-                                                  self.ECOM_NS.name) or "Unknown Product"),
-                    'quantity': int(self.graph.value(order, self.ECOM_NS.quantity) or 0),
-                    'status': str(self.graph.value(order, self.ECOM_NS.status) or "unknown"),
-                    'date': self.graph.value(order, self.ECOM_NS.orderDate)
-                }
-                orders.append(order_data)
-            except Exception as e:
-                print(f"Error processing order {order}: {str(e)}")
-                continue
+        return render(request, 'store/admin/orders.html', {
+            'orders': orders,
+            'previous_cursor': previous_cursor,
+            'next_cursor': next_cursor,
+            'status_choices': OrderIndex.STATUS_CHOICES,
+            'filters': request.GET,
+            'sort': 'date' if not self.is_descending(request.GET) else '-date',
+        })
+
+    def post(self, request):
+        """Bulk status transition for the selected (or all matching) orders"""
+        if request.session.get('user_type') != 'admin':
+            raise PermissionDenied
+        
+        new_status = request.POST.get('new_status')
+        if new_status not in dict(OrderIndex.STATUS_CHOICES):
+            messages.error(request, 'Invalid order status')
+            return redirect(request.get_full_path())
+        
+        try:
+            if request.POST.get('select_all_matching'):
+                order_ids = list(self.filter_orders(request.GET).values_list('order_id', flat=True))
+            else:
+                order_ids = request.POST.getlist('order_ids')
             
-        return render(request, 'store/admin/orders.html', {'orders': orders})
+            if not order_ids:
+                messages.error(request, 'No orders selected')
+                return redirect(request.get_full_path())
+            
+            transitioned = InventoryManagementAgent().transition_orders(order_ids, new_status)
+            skipped = len(order_ids) - len(transitioned)
+            messages.success(request, f'{len(transitioned)} order(s) marked as {new_status}'
+                             + (f', {skipped} skipped' if skipped else ''))
+        except Exception as e:
+            messages.error(request, f'Error updating orders: {str(e)}')
+        
+        return redirect(request.get_full_path())
+
+class OrderExportView(ViewOrdersView):
+    """Stream the (filtered) order index, plus archived orders from a start date, as CSV or NDJSON"""
+    def get(self, request):
+        if request.session.get('user_type') != 'admin':
+            raise PermissionDenied
+        
+        export_format = request.GET.get('format', 'csv')
+        if export_format not in EXPORT_FORMATS:
+            return HttpResponseBadRequest('Unsupported export format')
+        
+        try:
+            orders = self.filter_orders(request.GET)
+            date_from = parse_date(request.GET.get('date_from') or '')
+            date_to = parse_date(request.GET.get('date_to') or '') or timezone.localdate()
+        except ValueError:
+            return HttpResponseBadRequest('Invalid date filter')
+        if date_from and archive_partitions(date_from, date_to):
+            # Read through to the archive, like the listing
+            descending = self.is_descending(request.GET)
+            archived = iter_archived_orders(date_from, date_to, status=request.GET.get('status'),
+                                            customer=request.GET.get('customer'),
+                                            descending=descending)
+            rows = iter_order_rows(iter_merged_orders(orders.iterator(), archived, descending))
+        else:
+            rows = iter_orders(orders)
+        response = StreamingHttpResponse(
+            export_lines(rows, ORDER_FIELDS, export_format),
+            content_type=EXPORT_FORMATS[export_format]
+        )
+        response['Content-Disposition'] = f'attachment; filename="orders.{export_format}"'
+        return response
 
 class AdminView(LoginRequiredMixin, BaseOntologyView):
     """Admin dashboard and product management"""
@@ -558,17 +1001,10 @@ class AdminView(LoginRequiredMixin, BaseOntologyView):
                 'discount': float(request.POST.get('discount', 0)),
             }
             
-            # Handle image upload
+            # An uploaded image is processed in the background by the
+            # ImageProcessingAgent; the product shows the default until then
             image = request.FILES.get('image')
-            if image:
-                image_path = os.path.join('product_images', image.name)
-                os.makedirs(os.path.dirname(os.path.join(settings.MEDIA_ROOT, image_path)), 
-                           exist_ok=True)
-                with open(os.path.join(settings.MEDIA_ROOT, image_path), 'wb+') as f:
-                    for chunk in image.chunks():
-                        f.write(chunk)
-            else:
-                image_path = 'default_image.jpg'
+            image_path = 'default_image.jpg'
 
             # Create product in RDF graph
             product_id = product_name.lower().replace(" ", "_")
@@ -585,11 +1021,20 @@ class AdminView(LoginRequiredMixin, BaseOntologyView):
                 (self.ECOM_NS.hasImage, Literal(image_path, datatype=XSD.string))
             ]
 
+            # Re-adding a retired product brings it back with the new details
+            released_images = [self.graph.value(product, self.ECOM_NS.hasImage)]
+            self.graph.remove((product, self.ECOM_NS.deleted, None))
+            self.graph.remove((product, self.ECOM_NS.imagePlaceholder, None))
             for predicate, obj in product_properties:
-                self.graph.add((product, predicate, obj))
+                self.graph.set((product, predicate, obj))
 
-            self.save_graph()
+            self.save_graph(released_images)
+            index_products(self.graph, [product])
+            if image:
+                ImageProcessingAgent.enqueue(product_id, image)
             messages.success(request, 'Product added successfully!')
+            if image:
+                messages.info(request, 'The product image will appear once it has been processed')
             return redirect('baseAdmin')
             
         except Exception as e: